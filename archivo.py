@@ -0,0 +1,91 @@
+import logging
+import os
+from datetime import date, datetime, time, timedelta, timezone
+
+from sqlalchemy import delete, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import jobs
+from database import AsyncWriteSessionLocal
+from models import Reserva, ReservaArchivada
+from recordatorios import ZONA_HORARIA
+from reporting import refresh_dias
+
+logger = logging.getLogger(__name__)
+
+# Reservas dated more than this many days ago leave the hot table
+ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", "365"))
+# Local time of the daily run
+HORA_ARCHIVADO = time.fromisoformat(os.getenv("ARCHIVE_TIME", "03:00"))
+# Rows moved per transaction, so bookings never wait long behind the job;
+# also the IN list size, under SQLite's bound-parameter limit
+TAMANO_LOTE = int(os.getenv("ARCHIVE_BATCH_SIZE", "500"))
+
+COLUMNAS = [c.name for c in Reserva.__table__.columns]
+
+async def _mover(criterio) -> int:
+    movidas = 0
+    while True:
+        async with AsyncWriteSessionLocal() as db:
+            ids = (await db.scalars(select(Reserva.id).filter(criterio).limit(TAMANO_LOTE))).all()
+            if not ids:
+                return movidas
+            # An id re-imported after it was archived replaces its old copy;
+            # the days of both copies counted it twice until now
+            duplicadas = dict((await db.execute(
+                select(ReservaArchivada.id, ReservaArchivada.fecha).filter(ReservaArchivada.id.in_(ids))
+            )).all())
+            await db.execute(delete(ReservaArchivada).filter(ReservaArchivada.id.in_(list(duplicadas))))
+            await db.execute(insert(ReservaArchivada).from_select(
+                COLUMNAS, select(*(Reserva.__table__.c[c] for c in COLUMNAS)).filter(Reserva.id.in_(ids))
+            ))
+            fechas = set(duplicadas.values())
+            if duplicadas:
+                fechas.update(await db.scalars(select(Reserva.fecha).filter(Reserva.id.in_(list(duplicadas)))))
+            await db.execute(delete(Reserva).filter(Reserva.id.in_(ids)))
+            if fechas:
+                await refresh_dias(db, fechas)
+            await db.commit()
+        movidas += len(ids)
+
+async def archivar(limite: date) -> int:
+    """Moves reservas dated before ``limite`` and every soft-deleted one to
+    reservas_archivadas, a batch per transaction. Returns the rows moved."""
+    # Two passes so the first, usually the big one, walks the fecha index
+    movidas = await _mover(Reserva.fecha < limite)
+    return movidas + await _mover(Reserva.deleted_at.is_not(None))
+
+async def borrar_archivadas(db: AsyncSession, criterio):
+    """Deletes archived reservas matching ``criterio`` in the caller's
+    transaction, standing in for the foreign key cascade the archive does
+    not have. Returns their days, for refresh_dias."""
+    fechas = (await db.scalars(select(ReservaArchivada.fecha).filter(criterio).distinct())).all()
+    await db.execute(delete(ReservaArchivada).filter(criterio))
+    return fechas
+
+def proxima_ejecucion():
+    ahora = datetime.now(ZONA_HORARIA)
+    siguiente = datetime.combine(ahora.date(), HORA_ARCHIVADO, tzinfo=ZONA_HORARIA)
+    if siguiente <= ahora:
+        siguiente += timedelta(days=1)
+    return siguiente
+
+async def programar_archivo():
+    """Queues the next daily run; every worker calls it at startup and the
+    dedupe key keeps a single job per day."""
+    siguiente = proxima_ejecucion()
+    async with AsyncWriteSessionLocal() as db:
+        await jobs.enqueue(db, [jobs.job(
+            "archivar_reservas", {},
+            run_at=siguiente.astimezone(timezone.utc).replace(tzinfo=None),
+            dedupe_key=f"archivar_reservas:{siguiente.date().isoformat()}",
+        )])
+        await db.commit()
+
+@jobs.handler("archivar_reservas")
+async def archivar_reservas(trabajos):
+    # Tomorrow's run is queued first, so a failing run does not stop the schedule
+    await programar_archivo()
+    limite = datetime.now(ZONA_HORARIA).date() - timedelta(days=ARCHIVE_AFTER_DAYS)
+    movidas = await archivar(limite)
+    logger.info("Archived %d reservas dated before %s or deleted", movidas, limite)
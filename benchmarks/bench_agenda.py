@@ -0,0 +1,56 @@
+"""End-to-end latency of a 30-professional day view.
+
+Compares GET /reservas/agenda against the pattern it replaces: the day's
+reservas from GET /reservas/ followed by GET /pacientes/{id} per row.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_agenda
+"""
+import os
+import statistics
+import tempfile
+import time
+
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/bench.db")
+os.environ["RATE_LIMIT_ENABLED"] = "false"
+
+from fastapi.testclient import TestClient
+
+import main
+from benchmarks.datagen import generate_clinic
+from database import SessionLocal
+from routers.auth import get_current_user
+
+FECHA = "2024-03-06"
+
+def agenda(client):
+    response = client.get("/reservas/agenda", params={"fecha": FECHA})
+    assert response.status_code == 200, response.text
+    return sum(len(p["reservas"]) for p in response.json())
+
+def listado_mas_pacientes(client):
+    reservas = client.get("/reservas/", params={"fecha_desde": FECHA, "fecha_hasta": FECHA, "limit": 500}).json()
+    for r in reservas:
+        assert client.get(f"/pacientes/{r['paciente_id']}").status_code == 200
+    return len(reservas)
+
+def run(repeticiones=20):
+    db = SessionLocal()
+    generate_clinic(db, profesionales=30, dias=120)
+    db.close()
+
+    main.app.dependency_overrides[get_current_user] = lambda: {"email": "bench", "id": "bench", "role": "admin"}
+    client = TestClient(main.app)
+
+    for nombre, fn in (("agenda", agenda), ("listado + N pacientes", listado_mas_pacientes)):
+        tiempos = []
+        for _ in range(repeticiones):
+            t0 = time.perf_counter()
+            reservas = fn(client)
+            tiempos.append((time.perf_counter() - t0) * 1000)
+        tiempos.sort()
+        print(f"{nombre:<22} reservas={reservas:>4}  p50={statistics.median(tiempos):8.2f}ms  p95={tiempos[int(len(tiempos) * 0.95) - 1]:8.2f}ms")
+
+if __name__ == "__main__":
+    run()
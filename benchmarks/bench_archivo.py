@@ -0,0 +1,83 @@
+"""Hot-path latency with and without years of history in reservas.
+
+Seeds three years of reservas ending in the current month, times the
+agenda, availability and week-list endpoints, archives everything older
+than ARCHIVE_AFTER_DAYS and times them again. Also reports the archival
+rate and the size of the hot table.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_archivo
+"""
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+from datetime import date, timedelta
+
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/bench.db")
+os.environ["RATE_LIMIT_ENABLED"] = "false"
+os.environ["METRICS_ENABLED"] = "false"
+
+from fastapi.testclient import TestClient
+from sqlalchemy import func, select, text
+
+import archivo
+import main
+from benchmarks.datagen import generate_clinic
+from database import SessionLocal, engine
+from models import Reserva
+from routers.auth import get_current_user
+
+AÑOS = 3
+N = 200
+
+def mediana_ms(client, path, params):
+    tiempos = []
+    for _ in range(N):
+        t0 = time.perf_counter()
+        assert client.get(path, params=params).status_code == 200
+        tiempos.append(time.perf_counter() - t0)
+    return statistics.median(tiempos) * 1000
+
+def tabla(db):
+    filas = db.scalar(select(func.count()).select_from(Reserva))
+    with engine.connect() as conn:
+        bytes_ = conn.execute(text("SELECT sum(pgsize) FROM dbstat WHERE name IN (SELECT name FROM sqlite_master WHERE tbl_name = 'reservas')")).scalar()
+    return filas, bytes_
+
+def medir(client, ids, hoy):
+    semana = {"fecha_desde": hoy.isoformat(), "fecha_hasta": (hoy + timedelta(days=6)).isoformat()}
+    profesional = str(ids["profesionales"][0])
+    return {
+        "agenda": mediana_ms(client, "/reservas/agenda", {"fecha": hoy.isoformat()}),
+        "semana": mediana_ms(client, "/reservas/", semana),
+        "profesional": mediana_ms(client, "/reservas/", dict(semana, profesional_id=profesional)),
+        "disponibilidad": mediana_ms(client, "/reservas/disponibilidad", dict(semana, tratamiento_id=str(ids["tratamientos"][0]))),
+    }
+
+def run():
+    hoy = date.today()
+    db = SessionLocal()
+    ids = generate_clinic(db, profesionales=30, pacientes=10000, dias=AÑOS * 365, reservas_por_dia=8, desde=hoy - timedelta(days=AÑOS * 365 - 30))
+    main.app.dependency_overrides[get_current_user] = lambda: {"email": "bench", "id": "bench", "role": "admin"}
+    client = TestClient(main.app)
+
+    filas, bytes_ = tabla(db)
+    antes = medir(client, ids, hoy)
+    t0 = time.perf_counter()
+    movidas = asyncio.run(archivo.archivar(hoy - timedelta(days=archivo.ARCHIVE_AFTER_DAYS)))
+    segundos = time.perf_counter() - t0
+    db.execute(text("VACUUM"))
+    filas_despues, bytes_despues = tabla(db)
+    despues = medir(client, ids, hoy)
+    db.close()
+
+    print(f"archivadas {movidas} en {segundos:.1f}s ({movidas / segundos:.0f} filas/s)")
+    print(f"reservas: {filas} filas {bytes_ / 2**20:.1f}MB -> {filas_despues} filas {bytes_despues / 2**20:.1f}MB")
+    for nombre in antes:
+        print(f"{nombre:<16} antes={antes[nombre]:7.2f}ms  despues={despues[nombre]:7.2f}ms")
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,97 @@
+"""Sync session vs async session under concurrent load.
+
+Fires a slow report-style query every quarter second and, meanwhile, a steady
+stream of fast single-row lookups (one every few milliseconds). Latency of
+each fast lookup is measured from its scheduled arrival time, once with a
+blocking SessionLocal inside ``async def`` handlers (the old path) and once
+with the async ``get_db`` dependency.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_async_db
+"""
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/bench.db")
+
+import httpx
+from fastapi import Depends, FastAPI
+from sqlalchemy import func, select
+from sqlalchemy.orm import aliased
+
+from benchmarks.datagen import generate_clinic
+from database import Base, SessionLocal, engine, get_db
+from models import Reserva, Tratamiento
+
+def slow_query():
+    otra = aliased(Reserva)
+    return (
+        select(func.count())
+        .select_from(Reserva)
+        .join(otra, (otra.fecha == Reserva.fecha) & (otra.hora_inicio < Reserva.hora_fin))
+    )
+
+def build_app(tratamiento_id):
+    app = FastAPI()
+
+    @app.get("/sync/lento")
+    async def sync_lento():
+        db = SessionLocal()
+        try:
+            return db.scalar(slow_query())
+        finally:
+            db.close()
+
+    @app.get("/sync/rapido")
+    async def sync_rapido():
+        db = SessionLocal()
+        try:
+            return db.get(Tratamiento, tratamiento_id).nombre
+        finally:
+            db.close()
+
+    @app.get("/async/lento")
+    async def async_lento(db=Depends(get_db)):
+        return await db.scalar(slow_query())
+
+    @app.get("/async/rapido")
+    async def async_rapido(db=Depends(get_db)):
+        return (await db.get(Tratamiento, tratamiento_id)).nombre
+
+    return app
+
+async def load(app, modo, lentos=4, rapidos=200, intervalo=0.005, intervalo_lento=0.25):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        inicio = time.perf_counter()
+
+        async def timed(path, llegada):
+            await asyncio.sleep(max(0, inicio + llegada - time.perf_counter()))
+            response = await client.get(path)
+            assert response.status_code == 200, response.text
+            return (time.perf_counter() - inicio - llegada) * 1000
+
+        tareas = [timed(f"/{modo}/lento", i * intervalo_lento) for i in range(lentos)] + [timed(f"/{modo}/rapido", i * intervalo) for i in range(rapidos)]
+        tiempos = await asyncio.gather(*tareas)
+        total = time.perf_counter() - inicio
+
+    rapidos_ms = sorted(tiempos[lentos:])
+    print(f"{modo:<6} total={total:6.2f}s  req/s={len(tiempos) / total:7.1f}  "
+          f"rapido p50={statistics.median(rapidos_ms):8.2f}ms  p95={rapidos_ms[int(len(rapidos_ms) * 0.95) - 1]:8.2f}ms")
+
+def run():
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    ids = generate_clinic(db, profesionales=20, dias=120)
+    db.close()
+
+    app = build_app(ids["tratamientos"][0])
+    for modo in ("sync", "async"):
+        asyncio.run(load(app, modo))
+
+if __name__ == "__main__":
+    run()
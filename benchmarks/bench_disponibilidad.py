@@ -0,0 +1,49 @@
+"""Latency of GET /reservas/disponibilidad with 50 professionals and a year of bookings.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_disponibilidad
+"""
+import os
+import statistics
+import tempfile
+import time
+
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/bench.db")
+os.environ["RATE_LIMIT_ENABLED"] = "false"
+
+from fastapi.testclient import TestClient
+
+import main
+from benchmarks.datagen import generate_clinic
+from database import SessionLocal
+from routers.auth import get_current_user
+
+def run(repeticiones=50):
+    db = SessionLocal()
+    t0 = time.perf_counter()
+    ids = generate_clinic(db, profesionales=50, dias=365)
+    db.close()
+    print(f"generated clinic in {time.perf_counter() - t0:.1f}s")
+
+    main.app.dependency_overrides[get_current_user] = lambda: {"email": "bench", "id": "bench", "role": "admin"}
+    client = TestClient(main.app)
+
+    casos = {
+        "1 profesional, 1 semana": {"profesional_id": str(ids["profesionales"][0]), "fecha_desde": "2024-06-03", "fecha_hasta": "2024-06-09"},
+        "50 profesionales, 1 dia": {"fecha_desde": "2024-06-05", "fecha_hasta": "2024-06-05"},
+        "50 profesionales, 1 semana": {"fecha_desde": "2024-06-03", "fecha_hasta": "2024-06-09"},
+    }
+    for nombre, params in casos.items():
+        params["tratamiento_id"] = str(ids["tratamientos"][0])
+        tiempos = []
+        for _ in range(repeticiones):
+            t0 = time.perf_counter()
+            response = client.get("/reservas/disponibilidad", params=params)
+            tiempos.append((time.perf_counter() - t0) * 1000)
+            assert response.status_code == 200, response.text
+        tiempos.sort()
+        print(f"{nombre:<28} slots={len(response.json()):>5}  p50={statistics.median(tiempos):7.2f}ms  p95={tiempos[int(len(tiempos) * 0.95) - 1]:7.2f}ms")
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,138 @@
+"""Fan-out latency of the agenda change feed with 500 connected clients.
+
+Starts the app under uvicorn, subscribes CLIENTES WebSocket clients to one
+day, then books EVENTOS reservas on that day through the API. For every
+booking it records how long it took until the first and the last client
+had the event. The polling load the feed replaces is printed for
+reference: the same clients each calling GET /reservas/ every few seconds.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_eventos
+"""
+import asyncio
+import os
+import socket
+import statistics
+import tempfile
+import threading
+import time
+from datetime import timedelta
+
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/bench.db")
+os.environ["RATE_LIMIT_ENABLED"] = "false"
+
+import httpx
+import orjson
+import uvicorn
+from websockets.asyncio.client import connect
+
+import main
+from benchmarks.datagen import generate_clinic
+from database import SessionLocal
+from routers.auth import create_access_token
+
+CLIENTES = 500
+EVENTOS = 40
+FECHA = "2024-03-06"
+INTERVALO_POLLING = 5
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def start_server(port):
+    server = uvicorn.Server(uvicorn.Config(main.app, host="127.0.0.1", port=port, log_level="warning", backlog=CLIENTES * 2))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+    return server, thread
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+async def cliente(url, recibidos, listos):
+    async with connect(url, max_queue=None) as ws:
+        listos.append(ws)
+        async for message in ws:
+            evento = orjson.loads(message)
+            if evento["tipo"] == "creada":
+                recibidos.setdefault(evento["reserva"]["hora_inicio"], []).append(time.perf_counter())
+
+def percentiles(nombre, values):
+    print(f"{nombre:<24} p50={statistics.median(values) * 1000:8.2f}ms  p95={percentile(values, 0.95) * 1000:8.2f}ms  max={max(values) * 1000:8.2f}ms")
+
+async def bench(port, ids, token):
+    headers = {"Authorization": f"Bearer {token}"}
+    url = f"ws://127.0.0.1:{port}/reservas/eventos/ws?fecha={FECHA}&token={token}"
+    recibidos, listos = {}, []
+    tareas = []
+    for _ in range(CLIENTES):
+        tareas.append(asyncio.create_task(cliente(url, recibidos, listos)))
+        if len(tareas) % 50 == 0:
+            await asyncio.sleep(0.05)
+    while len(listos) < CLIENTES:
+        await asyncio.sleep(0.05)
+    await asyncio.sleep(0.5)
+
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", headers=headers) as http:
+        # Cost of one poll of the day listing, for the comparison
+        t0 = time.perf_counter()
+        for _ in range(20):
+            assert (await http.get("/reservas/", params={"fecha_desde": FECHA, "fecha_hasta": FECHA, "limit": 500})).status_code == 200
+        poll = (time.perf_counter() - t0) / 20
+
+        enviados = {}
+        for i in range(EVENTOS):
+            inicio = 19 * 60 + i
+            hora_inicio = f"{inicio // 60:02d}:{inicio % 60:02d}:00"
+            body = {
+                "paciente_id": str(ids["pacientes"][i]),
+                "profesional_id": str(ids["profesionales"][0]),
+                "tratamiento_id": str(ids["tratamientos"][0]),
+                "fecha": FECHA,
+                "hora_inicio": hora_inicio,
+                "hora_fin": f"{inicio // 60:02d}:{inicio % 60:02d}:30",
+                "atencion": "agendada",
+                "pago": "pendiente",
+            }
+            t0 = time.perf_counter()
+            assert (await http.post("/reservas/", json=body)).status_code == 201
+            enviados[hora_inicio] = t0
+            while len(recibidos.get(hora_inicio, ())) < CLIENTES:
+                if time.perf_counter() - t0 > 30:
+                    raise RuntimeError("Event not delivered to every client")
+                await asyncio.sleep(0.001)
+
+    for tarea in tareas:
+        tarea.cancel()
+    await asyncio.gather(*tareas, return_exceptions=True)
+
+    primero = [min(recibidos[k]) - t0 for k, t0 in enviados.items()]
+    ultimo = [max(recibidos[k]) - t0 for k, t0 in enviados.items()]
+    print(f"clientes={CLIENTES} eventos={len(enviados)} entregas={sum(len(v) for v in recibidos.values())}")
+    percentiles("POST -> primer cliente", primero)
+    percentiles("POST -> ultimo cliente", ultimo)
+    print(f"entregas/s durante el fan-out: {CLIENTES / statistics.median(ultimo):,.0f}")
+    print(f"polling equivalente: {CLIENTES / INTERVALO_POLLING:.0f} req/s x {poll * 1000:.2f}ms = "
+          f"{CLIENTES / INTERVALO_POLLING * poll:.2f}s de servidor por segundo")
+
+def run():
+    db = SessionLocal()
+    ids = generate_clinic(db, profesionales=30, dias=120)
+    db.close()
+    token = create_access_token("bench@example.com", "bench", "admin", timedelta(hours=1))
+
+    port = free_port()
+    server, thread = start_server(port)
+    try:
+        asyncio.run(bench(port, ids, token))
+    finally:
+        server.should_exit = True
+        thread.join()
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,70 @@
+"""Cost of Idempotency-Key handling on POST /reservas/ and of a replayed retry.
+
+For each store, times creates without a key, creates with a fresh key,
+and retries of an already answered key, which replay the stored response
+without touching the reservas table.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_idempotency
+"""
+import os
+import statistics
+import tempfile
+import time
+from datetime import date, timedelta
+
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/bench.db")
+os.environ["METRICS_ENABLED"] = "false"
+os.environ["RATE_LIMIT_ENABLED"] = "false"
+os.environ["IDEMPOTENCY_ENABLED"] = "false"
+os.environ["JOBS_ENABLED"] = "false"
+
+from fastapi.testclient import TestClient
+
+import idempotency
+import main
+from benchmarks.datagen import generate_clinic
+from database import SessionLocal
+from routers.auth import get_current_user
+
+N = 200
+
+def run():
+    db = SessionLocal()
+    ids = generate_clinic(db, profesionales=10, dias=30)
+    db.close()
+    main.app.dependency_overrides[get_current_user] = lambda: {"email": "bench", "id": "bench", "role": "admin"}
+
+    slots = iter(
+        (date(2030, 1, 1) + timedelta(days=d), h)
+        for d in range(10000) for h in range(9, 18)
+    )
+
+    def body():
+        fecha, hora = next(slots)
+        return {
+            "paciente_id": str(ids["pacientes"][0]), "profesional_id": str(ids["profesionales"][0]),
+            "tratamiento_id": str(ids["tratamientos"][0]), "fecha": fecha.isoformat(),
+            "hora_inicio": f"{hora:02d}:00", "hora_fin": f"{hora:02d}:30", "atencion": "agendada", "pago": "pendiente",
+        }
+
+    def timed(client, requests, status_code=201):
+        tiempos = []
+        for payload, headers in requests:
+            t0 = time.perf_counter()
+            assert client.post("/reservas/", json=payload, headers=headers).status_code == status_code
+            tiempos.append(time.perf_counter() - t0)
+        return statistics.median(tiempos) * 1000
+
+    sin_clave = timed(TestClient(main.app), [(body(), {}) for _ in range(N)])
+    print(f"sin clave            {sin_clave:7.2f}ms")
+    for nombre, store in idempotency.IDEMPOTENCY_STORES.items():
+        client = TestClient(idempotency.IdempotencyMiddleware(main.app, store=store()))
+        primeros = [(body(), {"Idempotency-Key": f"{nombre}-{i}"}) for i in range(N)]
+        primera = timed(client, primeros)
+        reintento = timed(client, primeros)
+        print(f"store={nombre:<9} primera={primera:7.2f}ms  reintento={reintento:7.2f}ms")
+
+if __name__ == "__main__":
+    run()
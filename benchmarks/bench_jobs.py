@@ -0,0 +1,77 @@
+"""Time to send a day's reminders through the job queue.
+
+Queues one reminder per reserva of a busy day and drains them with a
+transport that costs a fixed round trip per call plus a little per
+message, like an SMS provider's batch API. Compares one message per call
+with batched calls, with and without concurrent batches.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_jobs
+"""
+import asyncio
+import os
+import tempfile
+import time
+from datetime import date
+
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/bench.db")
+os.environ["RATE_LIMIT_ENABLED"] = "false"
+os.environ["METRICS_ENABLED"] = "false"
+
+from sqlalchemy import delete, select
+
+import jobs
+import main  # noqa: F401  creates the schema
+import recordatorios
+from benchmarks.datagen import generate_clinic
+from database import AsyncWriteSessionLocal, SessionLocal
+from models import Job, Reserva
+
+LATENCIA_LLAMADA = 0.05
+LATENCIA_MENSAJE = 0.0005
+
+class ProveedorSimulado:
+    def __init__(self):
+        self.llamadas = 0
+        self.enviados = 0
+
+    async def send_batch(self, mensajes):
+        self.llamadas += 1
+        self.enviados += len(mensajes)
+        await asyncio.sleep(LATENCIA_LLAMADA + LATENCIA_MENSAJE * len(mensajes))
+        return {}
+
+async def drenar(reservas, batch_size, concurrency):
+    async with AsyncWriteSessionLocal() as db:
+        await db.execute(delete(Job))
+        # Queued as due now instead of at tomorrow's send time
+        await jobs.enqueue(db, [
+            jobs.job("recordatorio", {"reserva_id": str(r.id), "fecha": r.fecha.isoformat()}, dedupe_key=f"recordatorio:{r.id}")
+            for r in reservas
+        ])
+        await db.commit()
+
+    recordatorios.transport = ProveedorSimulado()
+    jobs.HANDLERS["recordatorio"].batch_size = batch_size
+    queue = jobs.JobQueue(concurrency=concurrency)
+    t0 = time.perf_counter()
+    while await queue.dispatch():
+        pass
+    return time.perf_counter() - t0, recordatorios.transport
+
+def run():
+    db = SessionLocal()
+    generate_clinic(db, profesionales=250, pacientes=5000, dias=3, reservas_por_dia=8, desde=date(2024, 1, 1))
+    fecha = date(2024, 1, 2)
+    reservas = db.execute(select(Reserva.id, Reserva.fecha).filter(Reserva.fecha == fecha)).all()
+    db.close()
+
+    print(f"{len(reservas)} recordatorios, {LATENCIA_LLAMADA * 1000:.0f}ms por llamada + {LATENCIA_MENSAJE * 1000:.1f}ms por mensaje")
+    for batch_size, concurrency in ((1, 1), (1, 8), (100, 1), (100, 4)):
+        total, proveedor = asyncio.run(drenar(reservas, batch_size, concurrency))
+        print(f"lote={batch_size:<4} concurrencia={concurrency:<2} total={total:6.2f}s  "
+              f"msg/s={proveedor.enviados / total:8.1f}  llamadas={proveedor.llamadas}")
+
+if __name__ == "__main__":
+    run()
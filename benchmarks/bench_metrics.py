@@ -0,0 +1,63 @@
+"""Per-request cost of the metrics middleware and SQL hooks.
+
+Times the same requests against the bare app and against the app wrapped in
+MetricsMiddleware with both engines instrumented, alternating rounds so
+drift affects both sides equally.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_metrics
+"""
+import os
+import statistics
+import tempfile
+import time
+
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/bench.db")
+os.environ["RATE_LIMIT_ENABLED"] = "false"
+os.environ["METRICS_ENABLED"] = "false"
+
+from fastapi.testclient import TestClient
+
+import main
+import metrics
+from benchmarks.datagen import generate_clinic
+from database import SessionLocal, async_engine, engine
+from routers.auth import get_current_user
+
+REQUESTS = (
+    ("GET /tratamientos/{id}", lambda ids: f"/tratamientos/{ids['tratamientos'][0]}"),
+    ("GET /pacientes/", lambda ids: "/pacientes/"),
+    ("GET /reservas/agenda", lambda ids: "/reservas/agenda?fecha=2024-03-06"),
+)
+
+def timed(client, path, n):
+    t0 = time.perf_counter()
+    for _ in range(n):
+        assert client.get(path).status_code == 200
+    return (time.perf_counter() - t0) / n
+
+def run(rondas=10, n=50):
+    db = SessionLocal()
+    ids = generate_clinic(db, profesionales=10, dias=30)
+    db.close()
+
+    main.app.dependency_overrides[get_current_user] = lambda: {"email": "bench", "id": "bench", "role": "admin"}
+    bare = TestClient(main.app)
+    instrumented = TestClient(metrics.MetricsMiddleware(main.app))
+
+    for nombre, path in REQUESTS:
+        path = path(ids)
+        base, con = [], []
+        for _ in range(rondas):
+            base.append(timed(bare, path, n))
+            metrics.instrument_engine(engine)
+            metrics.instrument_engine(async_engine.sync_engine)
+            con.append(timed(instrumented, path, n))
+            metrics.uninstrument_engine(engine)
+            metrics.uninstrument_engine(async_engine.sync_engine)
+        b, c = statistics.median(base), statistics.median(con)
+        print(f"{nombre:<24} sin={b * 1000:7.3f}ms  con={c * 1000:7.3f}ms  overhead={(c - b) * 1e6:7.1f}us ({(c / b - 1) * 100:+.1f}%)")
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,83 @@
+"""Per-request cost of the rate limiter, and what it saves under a login
+brute force.
+
+Times the same requests against the bare app and against the app wrapped
+in RateLimitMiddleware with each store, under a budget large enough that
+nothing is refused. Then sends wrong passwords to /auth/token from one
+client with and without the limiter, counting the bcrypt verifications.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_ratelimit
+"""
+import os
+import statistics
+import tempfile
+import time
+from datetime import timedelta
+
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/bench.db")
+os.environ["METRICS_ENABLED"] = "false"
+os.environ["RATE_LIMIT_ENABLED"] = "false"
+
+from fastapi.testclient import TestClient
+
+import main
+import passwords
+import ratelimit
+from benchmarks.datagen import generate_clinic
+from database import SessionLocal
+from routers.auth import create_access_token
+
+INTENTOS = 30
+
+def timed(client, path, headers, n):
+    t0 = time.perf_counter()
+    for _ in range(n):
+        assert client.get(path, headers=headers).status_code == 200
+    return (time.perf_counter() - t0) / n
+
+def fuerza_bruta(client):
+    verificaciones = 0
+    verify = passwords.bcrypt_context.verify_and_update
+
+    def contar(*args):
+        nonlocal verificaciones
+        verificaciones += 1
+        return verify(*args)
+
+    passwords.bcrypt_context.verify_and_update = contar
+    t0 = time.perf_counter()
+    codes = [client.post("/auth/token", data={"username": "bench@example.com", "password": f"x{i}"}).status_code for i in range(INTENTOS)]
+    segundos = time.perf_counter() - t0
+    passwords.bcrypt_context.verify_and_update = verify
+    return segundos, verificaciones, codes.count(429)
+
+def run(rondas=10, n=50):
+    db = SessionLocal()
+    ids = generate_clinic(db, profesionales=10, dias=30)
+    db.close()
+
+    bare = TestClient(main.app)
+    bare.post("/auth/", json={"email": "bench@example.com", "password": "secreto", "role": "admin"})
+    headers = {"Authorization": f"Bearer {create_access_token('bench@example.com', 'bench', 'admin', timedelta(hours=1))}"}
+    path = f"/tratamientos/{ids['tratamientos'][0]}"
+
+    ratelimit.DEFAULT_BUDGET = ratelimit.Budget("default", per_minute=10**9, burst=10**9)
+    base = {nombre: [] for nombre in ratelimit.RATE_LIMIT_STORES}
+    con = {nombre: [] for nombre in ratelimit.RATE_LIMIT_STORES}
+    for _ in range(rondas):
+        for nombre, store in ratelimit.RATE_LIMIT_STORES.items():
+            limited = TestClient(ratelimit.RateLimitMiddleware(main.app, store=store()))
+            base[nombre].append(timed(bare, path, headers, n))
+            con[nombre].append(timed(limited, path, headers, n))
+    for nombre in ratelimit.RATE_LIMIT_STORES:
+        b, c = statistics.median(base[nombre]), statistics.median(con[nombre])
+        print(f"store={nombre:<9} sin={b * 1000:7.3f}ms  con={c * 1000:7.3f}ms  overhead={(c - b) * 1e6:7.1f}us")
+
+    for nombre, client in (("sin limite", bare), ("con limite", TestClient(ratelimit.RateLimitMiddleware(main.app, store=ratelimit.LocalRateLimitStore())))):
+        segundos, verificaciones, rechazados = fuerza_bruta(client)
+        print(f"{nombre}: {INTENTOS} intentos en {segundos:.2f}s, {verificaciones} verificaciones bcrypt, {rechazados} respuestas 429")
+
+if __name__ == "__main__":
+    run()
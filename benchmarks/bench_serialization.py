@@ -0,0 +1,65 @@
+"""Serialization throughput of a 10k-row reservas listing.
+
+Compares the previous path (ad-hoc dicts through jsonable_encoder and the
+stdlib-json JSONResponse) against the typed one (ReservaDetalle response
+model rendered by ORJSONResponse). Only serialization is timed; the rows
+are fetched once up front.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_serialization
+"""
+import os
+import statistics
+import tempfile
+import time
+
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/bench.db")
+os.environ["RATE_LIMIT_ENABLED"] = "false"
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, ORJSONResponse
+from pydantic import TypeAdapter
+
+import main  # noqa: F401  creates the schema
+from benchmarks.datagen import generate_clinic
+from database import SessionLocal
+from routers.reservas import ReservaDetalle, reservas_query
+
+FILAS = 10000
+
+adapter = TypeAdapter(list[ReservaDetalle])
+
+def dicts_jsonable_encoder(rows):
+    reservas = [dict(r._mapping) for r in rows]
+    return JSONResponse(jsonable_encoder(reservas)).body
+
+def response_model_orjson(rows):
+    reservas = [ReservaDetalle.model_validate(r) for r in rows]
+    # What FastAPI does with a response_model before handing it to the response class
+    return ORJSONResponse(adapter.dump_python(reservas, mode="json")).body
+
+def type_adapter_dump_json(rows):
+    return adapter.dump_json(adapter.validate_python(rows, from_attributes=True))
+
+def run(repeticiones=10):
+    db = SessionLocal()
+    generate_clinic(db, profesionales=20, dias=90)
+    rows = db.execute(reservas_query().limit(FILAS)).all()
+    db.close()
+
+    for nombre, fn in (
+        ("dicts + jsonable_encoder", dicts_jsonable_encoder),
+        ("response_model + orjson", response_model_orjson),
+        ("TypeAdapter.dump_json", type_adapter_dump_json),
+    ):
+        tiempos = []
+        for _ in range(repeticiones):
+            t0 = time.perf_counter()
+            body = fn(rows)
+            tiempos.append(time.perf_counter() - t0)
+        mediana = statistics.median(tiempos)
+        print(f"{nombre:<26} filas={len(rows)}  bytes={len(body):>8}  p50={mediana * 1000:8.2f}ms  filas/s={len(rows) / mediana:>10.0f}")
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,113 @@
+"""Concurrent bookings and agenda reads on SQLite, default vs tuned mode.
+
+Each mode runs in its own process, because the engine settings are read at
+import time. Bookings (POST /reservas/) and agenda reads (GET
+/reservas/agenda) arrive at fixed rates against one in-process app for
+DURACION seconds; arrivals are scheduled up front so a slow server cannot
+slow the load down. Failed requests are mostly "database is locked".
+
+Run from the repository root:
+
+    python -m benchmarks.bench_sqlite_concurrency
+"""
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+ESCRITURAS_POR_SEGUNDO = 40
+LECTURAS_POR_SEGUNDO = 40
+DURACION = 10
+DESDE = date(2024, 1, 1)
+DIAS = 60
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))] if values else 0.0
+
+async def worker_bench():
+    import httpx
+
+    import main
+    from benchmarks.datagen import generate_clinic
+    from database import SessionLocal
+    from routers.auth import get_current_user
+
+    db = SessionLocal()
+    ids = generate_clinic(db, profesionales=20, dias=DIAS, desde=DESDE)
+    db.close()
+    main.app.dependency_overrides[get_current_user] = lambda: {"email": "bench", "id": "bench", "role": "admin"}
+
+    profesionales = [str(i) for i in ids["profesionales"]]
+    resultados = {"write": [], "read": []}
+    errores = {"write": 0, "read": 0}
+
+    async def writer(client, i):
+        slot = i // len(profesionales)
+        inicio = 9 * 60 + (slot % 36) * 15
+        body = {
+            "paciente_id": str(ids["pacientes"][i % len(ids["pacientes"])]),
+            "profesional_id": profesionales[i % len(profesionales)],
+            "tratamiento_id": str(ids["tratamientos"][0]),
+            "fecha": (DESDE + timedelta(days=DIAS + 1 + slot // 36)).isoformat(),
+            "hora_inicio": f"{inicio // 60:02d}:{inicio % 60:02d}",
+            "hora_fin": f"{(inicio + 15) // 60:02d}:{(inicio + 15) % 60:02d}",
+            "atencion": "agendada",
+            "pago": "pendiente",
+        }
+        response = await client.post("/reservas/", json=body)
+        errores["write"] += response.status_code != 201
+
+    async def reader(client, i):
+        fecha = (DESDE + timedelta(days=i % DIAS)).isoformat()
+        response = await client.get("/reservas/agenda", params={"fecha": fecha})
+        errores["read"] += response.status_code != 200
+
+    async def arrival(kind, fn, client, i, at):
+        await asyncio.sleep(max(0.0, at - time.perf_counter()))
+        await fn(client, i)
+        # Latency counts from the scheduled arrival, including time queued
+        resultados[kind].append(time.perf_counter() - at)
+
+    transport = httpx.ASGITransport(app=main.app, raise_app_exceptions=False)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as client:
+        inicio = time.perf_counter() + 0.1
+        await asyncio.gather(
+            *(arrival("write", writer, client, i, inicio + i / ESCRITURAS_POR_SEGUNDO) for i in range(ESCRITURAS_POR_SEGUNDO * DURACION)),
+            *(arrival("read", reader, client, i, inicio + i / LECTURAS_POR_SEGUNDO) for i in range(LECTURAS_POR_SEGUNDO * DURACION)),
+        )
+        total = time.perf_counter() - inicio
+
+    return {
+        kind: {
+            "ok_s": (len(latencias) - errores[kind]) / total,
+            "errors": errores[kind],
+            "p50_ms": statistics.median(latencias) * 1000 if latencias else 0.0,
+            "p95_ms": percentile(latencias, 0.95) * 1000,
+        }
+        for kind, latencias in resultados.items()
+    }
+
+def run():
+    print(f"escrituras/s={ESCRITURAS_POR_SEGUNDO} lecturas/s={LECTURAS_POR_SEGUNDO} duracion={DURACION}s")
+    for modo, tuned in (("default", "false"), ("tuned", "true")):
+        env = dict(os.environ, SQLITE_TUNED=tuned, METRICS_ENABLED="false", RATE_LIMIT_ENABLED="false", DATABASE_URL=f"sqlite:///{tempfile.mkdtemp()}/bench.db")
+        output = subprocess.run(
+            [sys.executable, "-m", "benchmarks.bench_sqlite_concurrency", "--worker"],
+            env=env, check=True, capture_output=True, text=True,
+        ).stdout
+        r = json.loads(output.strip().splitlines()[-1])
+        for kind in ("write", "read"):
+            print(f"{modo:<8} {kind:<6} ok/s={r[kind]['ok_s']:8.1f}  errores={r[kind]['errors']:>5}  "
+                  f"p50={r[kind]['p50_ms']:8.2f}ms  p95={r[kind]['p95_ms']:8.2f}ms")
+
+if __name__ == "__main__":
+    if "--worker" in sys.argv:
+        print(json.dumps(asyncio.run(worker_bench())))
+    else:
+        run()
@@ -0,0 +1,93 @@
+"""Database size and join throughput with UUIDs stored as text vs 16 bytes.
+
+Each layout runs in its own process, because guid.UUID_STORAGE is read at
+import time. Both seed the same clinic, VACUUM, then time the joined
+reservas query over week-long ranges and a reservas-by-paciente lookup.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_uuid_storage
+"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+DESDE = date(2024, 1, 1)
+DIAS = 365
+RONDAS = 5
+CONSULTAS = 100
+
+def worker_bench(path):
+    from sqlalchemy import bindparam, text
+
+    import main  # noqa: F401  creates the schema
+    from benchmarks.datagen import generate_clinic
+    from database import SessionLocal, engine
+    from models import Reserva
+    from routers.reservas import reservas_query
+
+    db = SessionLocal()
+    ids = generate_clinic(db, profesionales=30, pacientes=10000, dias=DIAS, reservas_por_dia=10, desde=DESDE)
+    db.close()
+    with engine.connect() as conn:
+        conn.execute(text("VACUUM"))
+        indices = conn.execute(text("SELECT sum(pgsize) FROM dbstat WHERE name LIKE 'ix_%' OR name LIKE 'sqlite_autoindex_%'")).scalar()
+    size = os.path.getsize(path)
+
+    # Statements are built once so the timings are the database and row
+    # processing, not query construction
+    semana = reservas_query().filter(Reserva.fecha >= bindparam("desde"), Reserva.fecha <= bindparam("hasta"))
+    semana = semana.order_by(Reserva.fecha, Reserva.hora_inicio, Reserva.id)
+    paciente = reservas_query().filter(Reserva.paciente_id == bindparam("paciente_id"))
+
+    def semanas():
+        total = 0
+        for i in range(CONSULTAS):
+            desde = DESDE + timedelta(days=i % (DIAS - 7))
+            total += len(db.execute(semana, {"desde": desde, "hasta": desde + timedelta(days=6)}).all())
+        return total
+
+    def por_paciente():
+        total = 0
+        for i in range(CONSULTAS):
+            total += len(db.execute(paciente, {"paciente_id": ids["pacientes"][i % len(ids["pacientes"])]}).all())
+        return total
+
+    db = SessionLocal()
+    resultados = {"size_bytes": size, "index_bytes": indices}
+    for nombre, fn in (("semana", semanas), ("paciente", por_paciente)):
+        fn()
+        tiempos, filas = [], 0
+        for _ in range(RONDAS):
+            t0 = time.perf_counter()
+            filas = fn()
+            tiempos.append(time.perf_counter() - t0)
+        mediana = statistics.median(tiempos)
+        resultados[nombre] = {"q_s": CONSULTAS / mediana, "rows_s": filas / mediana}
+    db.close()
+    return resultados
+
+def run():
+    print(f"dias={DIAS} consultas={CONSULTAS} rondas={RONDAS}")
+    for modo in ("text", "binary"):
+        path = f"{tempfile.mkdtemp()}/bench.db"
+        env = dict(os.environ, UUID_STORAGE=modo, METRICS_ENABLED="false", RATE_LIMIT_ENABLED="false", DATABASE_URL=f"sqlite:///{path}")
+        output = subprocess.run(
+            [sys.executable, "-m", "benchmarks.bench_uuid_storage", "--worker", path],
+            env=env, check=True, capture_output=True, text=True,
+        ).stdout
+        r = json.loads(output.strip().splitlines()[-1])
+        print(f"{modo:<7} db={r['size_bytes'] / 2**20:7.1f}MB  indices={r['index_bytes'] / 2**20:6.1f}MB  "
+              f"semana={r['semana']['q_s']:7.1f}q/s ({r['semana']['rows_s']:9.0f} filas/s)  "
+              f"paciente={r['paciente']['q_s']:7.1f}q/s")
+
+if __name__ == "__main__":
+    if "--worker" in sys.argv:
+        print(json.dumps(worker_bench(sys.argv[sys.argv.index("--worker") + 1])))
+    else:
+        run()
@@ -0,0 +1,218 @@
+"""Latency and throughput of every router against a synthetic clinic.
+
+Seeds a fresh database with benchmarks.datagen, then drives the app
+in-process through httpx with a real login token and reports p50/p95/p99
+latency and req/s per scenario. ``--json`` writes the results, and
+``--baseline`` compares p95s against an earlier run and exits non-zero
+when a scenario got slower than ``--tolerance`` allows, so a CI job can
+fail on regressions.
+
+Run from the repository root:
+
+    python -m benchmarks.harness
+    python -m benchmarks.harness --pacientes 20000 --years 3 --concurrency 8
+    python -m benchmarks.harness --json bench.json --baseline baseline.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/bench.db")
+os.environ["RATE_LIMIT_ENABLED"] = "false"
+
+import httpx
+
+import main
+import reporting
+from benchmarks.datagen import generate_clinic
+from database import AsyncSessionLocal, SessionLocal
+
+DESDE = date(2024, 1, 1)
+PASSWORD = "bench-password"
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+class Clinic:
+    """Ids and sample rows the scenarios draw from."""
+
+    def __init__(self, ids, reservas, dias):
+        self.profesionales = [str(i) for i in ids["profesionales"]]
+        self.tratamientos = [str(i) for i in ids["tratamientos"]]
+        self.pacientes = [str(i) for i in ids["pacientes"]]
+        self.reservas = reservas
+        self.dias = dias
+        # New bookings go after the generated range so they never overlap
+        self.libre_desde = DESDE + timedelta(days=dias + 1)
+
+    def fecha(self, i):
+        return (DESDE + timedelta(days=i % self.dias)).isoformat()
+
+    def nueva_reserva(self, i):
+        profesional = i % len(self.profesionales)
+        slot = i // len(self.profesionales)
+        inicio = 9 * 60 + (slot % 36) * 15
+        return {
+            "paciente_id": self.pacientes[i % len(self.pacientes)],
+            "profesional_id": self.profesionales[profesional],
+            "tratamiento_id": self.tratamientos[i % len(self.tratamientos)],
+            "fecha": (self.libre_desde + timedelta(days=slot // 36)).isoformat(),
+            "hora_inicio": f"{inicio // 60:02d}:{inicio % 60:02d}",
+            "hora_fin": f"{(inicio + 15) // 60:02d}:{(inicio + 15) % 60:02d}",
+            "atencion": "agendada",
+            "pago": "pendiente",
+        }
+
+    def reserva_actualizada(self, i):
+        reserva = self.reservas[i % len(self.reservas)]
+        body = {k: reserva[k] for k in ("paciente_id", "profesional_id", "tratamiento_id", "fecha", "hora_inicio", "hora_fin", "pago")}
+        body["atencion"] = ("agendada", "confirmada", "espera", "atendida")[i % 4]
+        return {"url": f"/reservas/{reserva['id']}", "json": body}
+
+def paciente(prefijo, i):
+    return {"nombre": f"Bench{i}", "apellido": "Harness", "email": f"{prefijo}{i}@example.com", "telefono": f"+5691{i:07d}", "fecha_nacimiento": "1990-01-01"}
+
+# (router, scenario, method, request builder, expected status, max requests).
+# The cap keeps bcrypt-bound and full-table scenarios from dominating a run.
+SCENARIOS = [
+    ("auth", "login", "POST", lambda c, i: {"url": "/auth/token", "data": {"username": "bench@example.com", "password": PASSWORD}}, 200, 20),
+    ("users", "get", "GET", lambda c, i: {"url": "/user/"}, 200, None),
+    ("pacientes", "list", "GET", lambda c, i: {"url": "/pacientes/"}, 200, 20),
+    ("pacientes", "get", "GET", lambda c, i: {"url": f"/pacientes/{c.pacientes[i % len(c.pacientes)]}"}, 200, None),
+    ("pacientes", "search", "GET", lambda c, i: {"url": "/pacientes/search", "params": {"q": f"Nombre{i % 1000}"}}, 200, None),
+    ("pacientes", "create", "POST", lambda c, i: {"url": "/pacientes/", "json": paciente("nuevo", i)}, 201, None),
+    ("pacientes", "update", "PUT", lambda c, i: {"url": f"/pacientes/{c.pacientes[i % len(c.pacientes)]}", "json": paciente("editado", i)}, 204, None),
+    ("profesionales", "list", "GET", lambda c, i: {"url": "/profesionales/"}, 200, None),
+    ("profesionales", "get", "GET", lambda c, i: {"url": f"/profesionales/{c.profesionales[i % len(c.profesionales)]}"}, 200, None),
+    ("profesionales", "create", "POST", lambda c, i: {"url": "/profesionales/", "json": {"nombre_completo": f"Bench {i}", "tipo": "ayudante"}}, 201, None),
+    ("profesionales", "update", "PUT", lambda c, i: {"url": f"/profesionales/{c.profesionales[i % len(c.profesionales)]}", "json": {"nombre_completo": f"Profesional {i % len(c.profesionales)}", "tipo": "enfermera"}}, 204, None),
+    ("tratamientos", "list", "GET", lambda c, i: {"url": "/tratamientos/"}, 200, None),
+    ("tratamientos", "get", "GET", lambda c, i: {"url": f"/tratamientos/{c.tratamientos[i % len(c.tratamientos)]}"}, 200, None),
+    ("tratamientos", "create", "POST", lambda c, i: {"url": "/tratamientos/", "json": {"nombre": f"Bench {i}", "descripcion": None, "duracion_minutos": 30, "precio": 25000}}, 201, None),
+    ("tratamientos", "update", "PUT", lambda c, i: {"url": f"/tratamientos/{c.tratamientos[i % len(c.tratamientos)]}", "json": {"nombre": f"Tratamiento {i % len(c.tratamientos)}", "descripcion": "bench", "duracion_minutos": 45, "precio": 30000}}, 204, 20),
+    ("reservas", "list", "GET", lambda c, i: {"url": "/reservas/", "params": {"fecha_desde": c.fecha(i), "fecha_hasta": c.fecha(i + 6)}}, 200, None),
+    ("reservas", "get", "GET", lambda c, i: {"url": f"/reservas/{c.reservas[i % len(c.reservas)]['id']}"}, 200, None),
+    ("reservas", "agenda", "GET", lambda c, i: {"url": "/reservas/agenda", "params": {"fecha": c.fecha(i)}}, 200, None),
+    ("reservas", "disponibilidad", "GET", lambda c, i: {"url": "/reservas/disponibilidad", "params": {"tratamiento_id": c.tratamientos[i % len(c.tratamientos)], "fecha_desde": c.fecha(i), "fecha_hasta": c.fecha(i + 6)}}, 200, None),
+    ("reservas", "create", "POST", lambda c, i: {"url": "/reservas/", "json": c.nueva_reserva(i)}, 201, None),
+    ("reservas", "update", "PUT", lambda c, i: c.reserva_actualizada(i), 204, None),
+    ("reportes", "ingresos", "GET", lambda c, i: {"url": "/reportes/ingresos", "params": {"fecha_desde": c.fecha(i), "fecha_hasta": c.fecha(i + 30)}}, 200, None),
+    ("reportes", "utilizacion", "GET", lambda c, i: {"url": "/reportes/utilizacion", "params": {"fecha_desde": c.fecha(i), "fecha_hasta": c.fecha(i + 30)}}, 200, None),
+]
+
+async def run_scenario(client, clinic, scenario, requests, concurrency, start=0):
+    _, _, method, build, expected, cap = scenario
+    total = min(requests, cap) if cap else requests
+    latencies = []
+    errors = 0
+    # Shared by the workers; ``start`` keeps created rows unique across calls
+    counter = iter(range(start, start + total))
+
+    async def worker():
+        nonlocal errors
+        for i in counter:
+            kwargs = build(clinic, i)
+            t0 = time.perf_counter()
+            response = await client.request(method, **kwargs)
+            latencies.append(time.perf_counter() - t0)
+            if response.status_code != expected:
+                errors += 1
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    wall = time.perf_counter() - t0
+    return {
+        "requests": total,
+        "errors": errors,
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 3),
+        "req_s": round(total / wall, 1),
+    }
+
+async def bench(args):
+    db = SessionLocal()
+    dias = int(args.years * 365)
+    ids = generate_clinic(
+        db, profesionales=args.profesionales, tratamientos=args.tratamientos, pacientes=args.pacientes,
+        dias=dias, reservas_por_dia=args.reservas_por_dia, desde=DESDE, seed=args.seed,
+    )
+    db.close()
+    async with AsyncSessionLocal() as adb:
+        await reporting.rebuild_all(adb)
+        await adb.commit()
+
+    # Server errors count against the scenario instead of aborting the run
+    transport = httpx.ASGITransport(app=main.app, raise_app_exceptions=False)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as client:
+        response = await client.post("/auth/", json={"email": "bench@example.com", "password": PASSWORD, "role": "admin"})
+        assert response.status_code == 201, response.text
+        token = (await client.post("/auth/token", data={"username": "bench@example.com", "password": PASSWORD})).json()["access_token"]
+        client.headers["Authorization"] = f"Bearer {token}"
+
+        reservas = (await client.get("/reservas/", params={"limit": 500})).json()
+        clinic = Clinic(ids, reservas, dias)
+
+        results = {}
+        for scenario in SCENARIOS:
+            name = f"{scenario[0]}.{scenario[1]}"
+            if args.only and not any(name.startswith(o) for o in args.only):
+                continue
+            # A few untimed calls warm caches and connections first
+            await run_scenario(client, clinic, scenario, 3, 1)
+            results[name] = await run_scenario(client, clinic, scenario, args.requests, args.concurrency, start=3)
+    return results
+
+def print_results(results, baseline):
+    print(f"{'scenario':<28}{'n':>6}{'err':>5}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'req/s':>10}")
+    for name, r in results.items():
+        line = f"{name:<28}{r['requests']:>6}{r['errors']:>5}{r['p50_ms']:>10.2f}{r['p95_ms']:>10.2f}{r['p99_ms']:>10.2f}{r['req_s']:>10.1f}"
+        if name in baseline:
+            line += f"  p95 {(r['p95_ms'] / baseline[name]['p95_ms'] - 1) * 100:+.0f}%"
+        print(line)
+
+def regressions(results, baseline, tolerance):
+    return [
+        name for name, r in results.items()
+        if r["errors"] or (name in baseline and r["p95_ms"] > baseline[name]["p95_ms"] * (1 + tolerance))
+    ]
+
+def main_cli(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark every router against a synthetic clinic.")
+    parser.add_argument("--profesionales", type=int, default=20)
+    parser.add_argument("--tratamientos", type=int, default=15)
+    parser.add_argument("--pacientes", type=int, default=5000)
+    parser.add_argument("--years", type=float, default=1)
+    parser.add_argument("--reservas-por-dia", type=int, default=8)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--requests", type=int, default=200, help="requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--only", nargs="*", help="scenario name prefixes, e.g. reservas pacientes.get")
+    parser.add_argument("--json", help="write results to this file")
+    parser.add_argument("--baseline", help="results file of an earlier run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed p95 slowdown against the baseline")
+    args = parser.parse_args(argv)
+
+    results = asyncio.run(bench(args))
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    print_results(results, baseline)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+    failed = regressions(results, baseline, args.tolerance)
+    if failed:
+        print(f"Regressed or failing: {', '.join(failed)}", file=sys.stderr)
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main_cli()
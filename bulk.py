@@ -0,0 +1,141 @@
+import json
+from typing import Any
+
+from fastapi import HTTPException, Request
+from pydantic import BaseModel, ValidationError
+from sqlalchemy import select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import DataError, IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+CHUNK_SIZE = 1000
+MAX_BULK_ROWS = 50000
+# Keeps IN (...) lists under SQLite's bound-parameter limit
+IN_CHUNK_SIZE = 500
+
+class RowError(BaseModel):
+    row: int
+    detail: Any
+
+class BulkReport(BaseModel):
+    received: int
+    written: int
+    errors: list[RowError]
+
+def chunked(items, size):
+    items = list(items)
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+def row_error(row: int, detail):
+    return {"row": row, "detail": detail}
+
+async def read_rows(request: Request, schema):
+    """Parses a JSON array or an NDJSON body into ``schema`` instances.
+
+    Returns ``(total, rows, errors)`` where rows are ``(index, item)`` pairs
+    and errors carry the index of every row that failed to parse."""
+    body = await request.body()
+    errors = []
+    if request.headers.get("content-type", "").startswith("application/x-ndjson"):
+        raw = []
+        for i, line in enumerate(l for l in body.splitlines() if l.strip()):
+            try:
+                raw.append(json.loads(line))
+            except ValueError:
+                raw.append(None)
+                errors.append(row_error(i, "Invalid JSON"))
+    else:
+        try:
+            raw = json.loads(body)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid JSON body")
+        if not isinstance(raw, list):
+            raise HTTPException(status_code=400, detail="Expected a JSON array")
+    if len(raw) > MAX_BULK_ROWS:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_BULK_ROWS} rows per request")
+
+    failed = {e["row"] for e in errors}
+    rows = []
+    for i, item in enumerate(raw):
+        if i in failed:
+            continue
+        try:
+            rows.append((i, schema.model_validate(item)))
+        except ValidationError as e:
+            errors.append(row_error(i, e.errors(include_url=False, include_context=False, include_input=False)))
+    return len(raw), rows, errors
+
+async def existing_values(db: AsyncSession, column, values):
+    found = set()
+    for chunk in chunked(set(values), IN_CHUNK_SIZE):
+        found.update((await db.scalars(select(column).filter(column.in_(chunk)))).all())
+    return found
+
+def row_conflict(error) -> str:
+    return "Conflicts with existing data" if isinstance(error, IntegrityError) else "Invalid data"
+
+async def write_chunk(db: AsyncSession, statement, chunk, check=None):
+    """Writes ``chunk`` in one transaction. A chunk the database rejects is
+    rolled back and split in halves until the failing rows are isolated,
+    so each one is reported and the rest are still written.
+
+    ``check(db, chunk)`` runs first in the same transaction and returns the
+    rows to write plus errors for the others; locks it takes are held
+    until the commit. Returns ``(written, errors)``."""
+    errors = []
+    if check is not None:
+        chunk, errors = await check(db, chunk)
+    if not chunk:
+        await db.rollback()
+        return 0, errors
+    try:
+        await db.execute(statement, [values for _, values in chunk])
+        await db.commit()
+        return len(chunk), errors
+    except (IntegrityError, DataError) as e:
+        await db.rollback()
+        if len(chunk) == 1:
+            return 0, errors + [row_error(chunk[0][0], row_conflict(e))]
+    middle = len(chunk) // 2
+    written = 0
+    for half in (chunk[:middle], chunk[middle:]):
+        half_written, half_errors = await write_chunk(db, statement, half, check)
+        written += half_written
+        errors.extend(half_errors)
+    return written, errors
+
+async def upsert(db: AsyncSession, model, rows, update_columns, check=None):
+    """INSERT ... ON CONFLICT (id) DO UPDATE in CHUNK_SIZE transactions.
+
+    ``rows`` are ``(index, values)`` pairs. A repeated id is reported
+    against every row after its first; rows the database rejects are
+    reported row by row, see write_chunk."""
+    insert = postgresql.insert if db.bind.dialect.name == "postgresql" else sqlite.insert
+    statement = insert(model)
+    set_ = {c: statement.excluded[c] for c in update_columns}
+    if "version" in model.__table__.c:
+        # An overwritten row gets a new ETag like any other update
+        set_["version"] = model.__table__.c.version + 1
+    statement = statement.on_conflict_do_update(index_elements=[model.id], set_=set_)
+
+    errors = []
+    unique = []
+    seen = set()
+    # PostgreSQL refuses a statement that upserts the same id twice
+    for i, values in rows:
+        if values["id"] in seen:
+            errors.append(row_error(i, "Duplicate id in request"))
+        else:
+            seen.add(values["id"])
+            unique.append((i, values))
+
+    written = 0
+    for chunk in chunked(unique, CHUNK_SIZE):
+        chunk_written, chunk_errors = await write_chunk(db, statement, chunk, check)
+        written += chunk_written
+        errors.extend(chunk_errors)
+    return written, errors
+
+def report(total, written, errors):
+    return BulkReport(received=total, written=written, errors=sorted(errors, key=lambda e: e["row"]))
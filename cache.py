@@ -0,0 +1,127 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from fastapi import Request, Response
+from pydantic import TypeAdapter
+from sqlalchemy import select, update
+from sqlalchemy.exc import IntegrityError
+
+from database import AsyncSessionLocal, AsyncWriteSessionLocal
+from models import CacheVersion
+
+class TTLCache:
+    """Bounded LRU cache whose entries expire at a per-entry epoch timestamp."""
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry[1] <= time.time():
+                del self._data[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key, value, expires_at: float = None):
+        if expires_at is None:
+            expires_at = time.time() + self.ttl
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._data)}
+
+class LocalCacheBackend:
+    """In-process version counters; enough for one worker and for tests."""
+
+    def __init__(self):
+        self._versions = {}
+
+    async def get_version(self, name: str) -> int:
+        return self._versions.get(name, 0)
+
+    async def bump_version(self, name: str) -> int:
+        self._versions[name] = self._versions.get(name, 0) + 1
+        return self._versions[name]
+
+class DatabaseCacheBackend:
+    """Version counters in the cache_versions table so every worker sharing
+    the database sees the same invalidations."""
+
+    async def get_version(self, name: str) -> int:
+        async with AsyncSessionLocal() as db:
+            version = await db.scalar(select(CacheVersion.version).filter(CacheVersion.name == name))
+        return version or 0
+
+    async def bump_version(self, name: str) -> int:
+        async with AsyncWriteSessionLocal() as db:
+            result = await db.execute(
+                update(CacheVersion).filter(CacheVersion.name == name).values(version=CacheVersion.version + 1)
+            )
+            if result.rowcount == 0:
+                db.add(CacheVersion(name=name, version=1))
+            try:
+                await db.commit()
+            except IntegrityError:
+                # Another worker created the row first
+                await db.rollback()
+                return await self.bump_version(name)
+        return await self.get_version(name)
+
+CACHE_BACKENDS = {"local": LocalCacheBackend, "database": DatabaseCacheBackend}
+
+cache_backend = CACHE_BACKENDS[os.getenv("CACHE_BACKEND", "local")]()
+
+class ResponseCache:
+    """Serialized JSON body of a rarely changing listing, served with an ETag.
+
+    The body is rebuilt whenever the backend's version for ``name`` moves."""
+
+    def __init__(self, name: str, schema, backend=None):
+        self.name = name
+        self.adapter = TypeAdapter(schema)
+        self.backend = backend
+        self._version = None
+        self._body = None
+        self._etag = None
+
+    async def respond(self, request: Request, load) -> Response:
+        backend = self.backend or cache_backend
+        version = await backend.get_version(self.name)
+        if version != self._version:
+            body = self.adapter.dump_json(self.adapter.validate_python(await load(), from_attributes=True))
+            self._body, self._etag, self._version = body, f'"{hashlib.sha1(body).hexdigest()}"', version
+
+        headers = {"ETag": self._etag, "Cache-Control": "private, no-cache"}
+        if_none_match = request.headers.get("if-none-match", "")
+        if self._etag in (tag.strip().removeprefix("W/") for tag in if_none_match.split(",")):
+            return Response(status_code=304, headers=headers)
+        return Response(self._body, media_type="application/json", headers=headers)
+
+    async def invalidate(self):
+        await (self.backend or cache_backend).bump_version(self.name)
@@ -0,0 +1,31 @@
+from typing import Optional
+
+from fastapi import HTTPException
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm.exc import StaleDataError
+from starlette import status
+
+def etag(model) -> str:
+    return f'"{model.version}"'
+
+def modified(headers=None):
+    return HTTPException(status_code=status.HTTP_412_PRECONDITION_FAILED, detail="Modified by another request", headers=headers)
+
+def check_if_match(if_match: Optional[str], model):
+    """Raises 412 unless ``if_match`` is absent, ``*`` or lists the row's
+    current ETag. Versions are strong validators, so weak tags never match."""
+    if if_match is None:
+        return
+    tags = {tag.strip() for tag in if_match.split(",")}
+    if "*" not in tags and etag(model) not in tags:
+        raise modified({"ETag": etag(model)})
+
+async def flush(db: AsyncSession):
+    """Flushes a versioned update. The UPDATE matches on the version read
+    earlier, so a concurrent commit in between turns it into a 412 here
+    instead of a lost update."""
+    try:
+        await db.flush()
+    except StaleDataError:
+        await db.rollback()
+        raise modified()
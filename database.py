@@ -1,11 +1,103 @@
-from sqlalchemy import create_engine
+import os
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.orm import declarative_base
 
-SQLALCHEMY_DATABASE_URL = "sqlite:///./estetica.db"
+SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./estetica.db")
+
+ASYNC_DRIVERS = {"sqlite": "sqlite+aiosqlite", "postgresql": "postgresql+asyncpg"}
+
+def async_database_url(url: str) -> str:
+    url = make_url(url)
+    return url.set(drivername=ASYNC_DRIVERS.get(url.get_backend_name(), url.drivername)).render_as_string(hide_password=False)
+
+SQLALCHEMY_ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL", async_database_url(SQLALCHEMY_DATABASE_URL))
+
+POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+# How long a write may wait its turn for the SQLite write connection
+WRITE_QUEUE_TIMEOUT = int(os.getenv("SQLITE_WRITE_QUEUE_TIMEOUT", "30"))
+
+IS_SQLITE = make_url(SQLALCHEMY_DATABASE_URL).get_backend_name() == "sqlite"
+SQLITE_TUNED = os.getenv("SQLITE_TUNED", "true").lower() == "true"
+
+SQLITE_PRAGMAS = {
+    # Readers keep going while a writer commits
+    "journal_mode": "WAL",
+    # Durable across application crashes; only a power loss can drop the
+    # last commits, which is the usual trade-off with WAL
+    "synchronous": "NORMAL",
+    "mmap_size": int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024))),
+    # Negative values are KiB
+    "cache_size": -int(os.getenv("SQLITE_CACHE_SIZE_KB", "65536")),
+    # Wait for another process's writer instead of failing with "database is locked"
+    "busy_timeout": int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000")),
+    "foreign_keys": "ON",
+    "temp_store": "MEMORY",
+}
+
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    for name, value in SQLITE_PRAGMAS.items():
+        cursor.execute(f"PRAGMA {name}={value}")
+    cursor.close()
 
+def _driver_autocommit(dbapi_connection, connection_record):
+    # Stops the driver from issuing its own deferred BEGIN so the one below is used
+    dbapi_connection.isolation_level = None
+
+def _begin_immediate(connection):
+    connection.exec_driver_sql("BEGIN IMMEDIATE")
+
+# Sync engine for startup, scripts and benchmarks; request handlers use the async one
 engine = create_engine(SQLALCHEMY_DATABASE_URL)
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+async_engine = create_async_engine(
+    SQLALCHEMY_ASYNC_DATABASE_URL,
+    pool_size=POOL_SIZE,
+    max_overflow=MAX_OVERFLOW,
+    pool_pre_ping=POOL_PRE_PING,
+    pool_recycle=POOL_RECYCLE,
+)
+
+if IS_SQLITE and SQLITE_TUNED:
+    event.listen(engine, "connect", set_sqlite_pragmas)
+    event.listen(async_engine.sync_engine, "connect", set_sqlite_pragmas)
+
+    # SQLite has a single writer, so writes share one pooled connection and
+    # queue for it in arrival order. A session holds it only from its first
+    # statement to commit, and the transaction takes the write lock up front
+    # so it never fails halfway through upgrading a read lock. The pool
+    # above keeps serving readers in parallel.
+    async_write_engine = create_async_engine(
+        SQLALCHEMY_ASYNC_DATABASE_URL,
+        pool_size=1,
+        max_overflow=0,
+        pool_timeout=WRITE_QUEUE_TIMEOUT,
+        pool_recycle=POOL_RECYCLE,
+    )
+    event.listen(async_write_engine.sync_engine, "connect", set_sqlite_pragmas)
+    event.listen(async_write_engine.sync_engine, "connect", _driver_autocommit)
+    event.listen(async_write_engine.sync_engine, "begin", _begin_immediate)
+else:
+    async_write_engine = async_engine
+
+AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+AsyncWriteSessionLocal = async_sessionmaker(async_write_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+
+async def get_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+async def get_write_db():
+    async with AsyncWriteSessionLocal() as db:
+        yield db
+
 Base = declarative_base()
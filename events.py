@@ -0,0 +1,120 @@
+import asyncio
+import logging
+import os
+from datetime import datetime, timedelta, timezone
+
+import orjson
+from sqlalchemy import delete, func, insert, select
+
+from database import AsyncSessionLocal, AsyncWriteSessionLocal
+from models import AgendaEvento
+
+logger = logging.getLogger(__name__)
+
+QUEUE_SIZE = int(os.getenv("EVENT_QUEUE_SIZE", "256"))
+POLL_SECONDS = float(os.getenv("EVENT_POLL_SECONDS", "0.5"))
+RETENTION_SECONDS = int(os.getenv("EVENT_RETENTION_SECONDS", "300"))
+
+# Sent in place of a backlog a slow client could not keep up with; the
+# client refetches its view instead of replaying every missed change
+SINCRONIZAR = orjson.dumps({"tipo": "sincronizar"}).decode()
+
+def canal_fecha(fecha) -> str:
+    return f"fecha:{fecha.isoformat()}"
+
+def canal_profesional(profesional_id) -> str:
+    return f"profesional:{profesional_id}"
+
+class Subscription:
+    def __init__(self, broker, channels):
+        self.broker = broker
+        self.channels = channels
+        self.queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+
+    def put(self, message: str):
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(SINCRONIZAR)
+
+    async def get(self) -> str:
+        return await self.queue.get()
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+class LocalBroker:
+    """Fans events out to the subscribers of this process only."""
+
+    def __init__(self):
+        self._channels = {}
+
+    def subscribe(self, channels) -> Subscription:
+        subscription = Subscription(self, set(channels))
+        for channel in subscription.channels:
+            self._channels.setdefault(channel, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        for channel in subscription.channels:
+            subscribers = self._channels.get(channel)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._channels[channel]
+
+    def deliver(self, channels, message: str):
+        # A subscriber listening on several of the channels gets the event once
+        subscribers = set()
+        for channel in channels:
+            subscribers.update(self._channels.get(channel, ()))
+        for subscription in subscribers:
+            subscription.put(message)
+
+    async def publish(self, channels, event: dict):
+        # Serialized once, however many clients receive it
+        self.deliver(channels, orjson.dumps(event).decode())
+
+class DatabaseBroker(LocalBroker):
+    """Events go through the agenda_eventos table; every worker polls it and
+    delivers new rows to its own subscribers."""
+
+    def __init__(self):
+        super().__init__()
+        self._last_id = None
+
+    async def publish(self, channels, event: dict):
+        async with AsyncWriteSessionLocal() as db:
+            await db.execute(insert(AgendaEvento).values(canales=" ".join(channels), payload=orjson.dumps(event).decode()))
+            await db.commit()
+
+    async def poll(self):
+        async with AsyncSessionLocal() as db:
+            if self._last_id is None:
+                self._last_id = await db.scalar(select(func.max(AgendaEvento.id))) or 0
+            eventos = (await db.execute(
+                select(AgendaEvento.id, AgendaEvento.canales, AgendaEvento.payload)
+                .filter(AgendaEvento.id > self._last_id)
+                .order_by(AgendaEvento.id)
+            )).all()
+            for evento in eventos:
+                self.deliver(evento.canales.split(), evento.payload)
+                self._last_id = evento.id
+        limite = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(seconds=RETENTION_SECONDS)
+        async with AsyncWriteSessionLocal() as db:
+            await db.execute(delete(AgendaEvento).filter(AgendaEvento.created_at < limite))
+            await db.commit()
+
+    async def run(self, interval: float = POLL_SECONDS):
+        while True:
+            try:
+                await self.poll()
+            except Exception:
+                logger.exception("Polling agenda events failed")
+            await asyncio.sleep(interval)
+
+BROKERS = {"local": LocalBroker, "database": DatabaseBroker}
+
+broker = BROKERS[os.getenv("EVENT_BROKER", "local")]()
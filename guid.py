@@ -0,0 +1,39 @@
+import os
+import uuid
+
+from sqlalchemy import LargeBinary
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.types import TypeDecorator
+
+# "binary" keeps UUIDs as 16 raw bytes on SQLite; "text" is the original
+# 32-character hex layout, for databases not yet migrated to revision 0002
+UUID_STORAGE = os.getenv("UUID_STORAGE", "binary")
+
+class GUID(TypeDecorator):
+    """UUID column: native ``uuid`` on PostgreSQL, 16 bytes on SQLite.
+
+    Raw bytes compare and sort in the same order as the hex text did, so
+    keyset cursors and ORDER BY id behave the same in both layouts."""
+
+    impl = LargeBinary
+    cache_ok = True
+
+    def load_dialect_impl(self, dialect):
+        if dialect.name == "postgresql" or UUID_STORAGE == "text":
+            return dialect.type_descriptor(postgresql.UUID(as_uuid=True))
+        return dialect.type_descriptor(LargeBinary(16))
+
+    def _native(self, dialect) -> bool:
+        return dialect.name == "postgresql" or UUID_STORAGE == "text"
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        if not isinstance(value, uuid.UUID):
+            value = uuid.UUID(str(value))
+        return value if self._native(dialect) else value.bytes
+
+    def process_result_value(self, value, dialect):
+        if value is None or isinstance(value, uuid.UUID):
+            return value
+        return uuid.UUID(bytes=value)
@@ -0,0 +1,196 @@
+import hashlib
+import os
+import time
+from datetime import datetime, timedelta, timezone
+
+import orjson
+from fastapi.responses import ORJSONResponse
+from sqlalchemy import delete, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+
+from cache import TTLCache
+from database import AsyncSessionLocal, AsyncWriteSessionLocal
+from models import IdempotencyKey
+from ratelimit import client_key
+
+IDEMPOTENCY_ENABLED = os.getenv("IDEMPOTENCY_ENABLED", "true").lower() == "true"
+# How long a response is replayed for retries carrying its key
+TTL_SECONDS = int(os.getenv("IDEMPOTENCY_TTL_SECONDS", "3600"))
+# A first request still running after this long is assumed lost with its
+# worker, and the key can be used again
+LEASE_SECONDS = int(os.getenv("IDEMPOTENCY_LEASE_SECONDS", "60"))
+# Larger responses are not kept; a retry runs the request again
+MAX_BODY_BYTES = int(os.getenv("IDEMPOTENCY_MAX_BODY_BYTES", str(64 * 1024)))
+LOCAL_MAX_KEYS = int(os.getenv("IDEMPOTENCY_MAX_KEYS", "10000"))
+MAX_KEY_LENGTH = 255
+METHODS = {"POST", "PUT", "PATCH", "DELETE"}
+PRUNE_SECONDS = 3600
+
+def utcnow() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+class LocalIdempotencyStore:
+    """Responses in this process's memory; a retry that reaches another
+    worker runs again."""
+
+    def __init__(self, maxsize: int = LOCAL_MAX_KEYS):
+        self._entries = TTLCache(maxsize=maxsize, ttl=TTL_SECONDS)
+
+    async def claim(self, key: str) -> bool:
+        """Marks ``key`` in progress; False when it is already taken."""
+        # No await between the check and the set, so no other request interleaves
+        if self._entries.get(key) is not None:
+            return False
+        self._entries.set(key, {"status_code": None}, expires_at=time.time() + LEASE_SECONDS)
+        return True
+
+    async def get(self, key: str):
+        return self._entries.get(key)
+
+    async def save(self, key: str, entry: dict):
+        self._entries.set(key, entry)
+
+    async def release(self, key: str):
+        self._entries.delete(key)
+
+class DatabaseIdempotencyStore:
+    """Responses in the idempotency_keys table, so a retry is answered by
+    whichever worker it reaches."""
+
+    def __init__(self):
+        self._pruned_at = 0.0
+
+    async def claim(self, key: str) -> bool:
+        now = utcnow()
+        lease = now + timedelta(seconds=LEASE_SECONDS)
+        async with AsyncWriteSessionLocal() as db:
+            insert = postgresql.insert if db.bind.dialect.name == "postgresql" else sqlite.insert
+            # Takes over an expired key, never a live one
+            claimed = await db.scalar(
+                insert(IdempotencyKey)
+                .values(key=key, expires_at=lease)
+                .on_conflict_do_update(
+                    index_elements=[IdempotencyKey.key],
+                    set_={"fingerprint": None, "status_code": None, "headers": None, "body": None, "expires_at": lease},
+                    where=IdempotencyKey.expires_at < now,
+                )
+                .returning(IdempotencyKey.key)
+            )
+            if time.monotonic() - self._pruned_at > PRUNE_SECONDS:
+                await db.execute(delete(IdempotencyKey).filter(IdempotencyKey.expires_at < now))
+                self._pruned_at = time.monotonic()
+            await db.commit()
+        return claimed is not None
+
+    async def get(self, key: str):
+        async with AsyncSessionLocal() as db:
+            row = (await db.execute(
+                select(IdempotencyKey.fingerprint, IdempotencyKey.status_code, IdempotencyKey.headers, IdempotencyKey.body)
+                .filter(IdempotencyKey.key == key, IdempotencyKey.expires_at >= utcnow())
+            )).one_or_none()
+        if row is None:
+            return None
+        return {"fingerprint": row.fingerprint, "status_code": row.status_code, "headers": orjson.loads(row.headers or "[]"), "body": row.body}
+
+    async def save(self, key: str, entry: dict):
+        async with AsyncWriteSessionLocal() as db:
+            await db.execute(update(IdempotencyKey).filter(IdempotencyKey.key == key).values(
+                fingerprint=entry["fingerprint"],
+                status_code=entry["status_code"],
+                headers=orjson.dumps(entry["headers"]).decode(),
+                body=entry["body"],
+                expires_at=utcnow() + timedelta(seconds=TTL_SECONDS),
+            ))
+            await db.commit()
+
+    async def release(self, key: str):
+        async with AsyncWriteSessionLocal() as db:
+            await db.execute(delete(IdempotencyKey).filter(IdempotencyKey.key == key))
+            await db.commit()
+
+IDEMPOTENCY_STORES = {"local": LocalIdempotencyStore, "database": DatabaseIdempotencyStore}
+
+store = IDEMPOTENCY_STORES[os.getenv("IDEMPOTENCY_STORE", "local")]()
+
+def error(status_code: int, detail: str, headers=None):
+    return ORJSONResponse({"detail": detail}, status_code=status_code, headers=headers)
+
+class IdempotencyMiddleware:
+    """Replays the stored response when a write is retried with the same
+    Idempotency-Key header, instead of running it again.
+
+    Keys are scoped to the client and remembered for TTL_SECONDS. Reusing
+    one for a different request is a 422, and retrying while the first
+    request is still running is a 409. Server errors and 429s are not
+    stored, so those can be retried, nor are responses to requests whose
+    body the app never read."""
+
+    def __init__(self, app, store=None):
+        self.app = app
+        self.store = store
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] not in METHODS:
+            return await self.app(scope, receive, send)
+        header = next((value.decode("latin-1") for name, value in scope["headers"] if name == b"idempotency-key"), None)
+        if header is None:
+            return await self.app(scope, receive, send)
+        if not header or len(header) > MAX_KEY_LENGTH:
+            return await error(400, "Invalid Idempotency-Key")(scope, receive, send)
+
+        store_ = self.store or store
+        key = f"{client_key(scope, by_ip=False)}:{header}"
+        fingerprint = hashlib.sha256(f"{scope['method']} {scope['path']}?{scope['query_string'].decode('latin-1')}\n".encode())
+
+        if not await store_.claim(key):
+            entry = await store_.get(key)
+            if entry is None or entry["status_code"] is None:
+                return await error(409, "A request with this Idempotency-Key is in progress", {"Retry-After": "1"})(scope, receive, send)
+            more_body = True
+            while more_body:
+                message = await receive()
+                fingerprint.update(message.get("body", b""))
+                more_body = message.get("more_body", False)
+            if fingerprint.hexdigest() != entry["fingerprint"]:
+                return await error(422, "Idempotency-Key was used for a different request")(scope, receive, send)
+            headers = [(name.encode("latin-1"), value.encode("latin-1")) for name, value in entry["headers"]]
+            await send({"type": "http.response.start", "status": entry["status_code"], "headers": [*headers, (b"idempotent-replayed", b"true")]})
+            await send({"type": "http.response.body", "body": entry["body"]})
+            return
+
+        # The body is hashed as the app reads it, so uploads still stream
+        response = {"status": 500, "headers": [], "body": bytearray(), "complete": False, "read": False}
+
+        async def receive_wrapper():
+            message = await receive()
+            if message["type"] == "http.request":
+                fingerprint.update(message.get("body", b""))
+                response["read"] = not message.get("more_body", False)
+            return message
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+                response["headers"] = message.get("headers", [])
+            elif message["type"] == "http.response.body":
+                if len(response["body"]) <= MAX_BODY_BYTES:
+                    response["body"] += message.get("body", b"")
+                response["complete"] = not message.get("more_body", False)
+            await send(message)
+
+        try:
+            await self.app(scope, receive_wrapper, send_wrapper)
+        except Exception:
+            await store_.release(key)
+            raise
+        # The fingerprint covers the body only once the app has read all of it
+        stored = response["complete"] and response["read"] and len(response["body"]) <= MAX_BODY_BYTES
+        if stored and response["status"] < 500 and response["status"] != 429:
+            await store_.save(key, {
+                "fingerprint": fingerprint.hexdigest(),
+                "status_code": response["status"],
+                "headers": [(name.decode("latin-1"), value.decode("latin-1")) for name, value in response["headers"]],
+                "body": bytes(response["body"]),
+            })
+        else:
+            await store_.release(key)
@@ -0,0 +1,49 @@
+from bisect import bisect_left, bisect_right
+from datetime import time
+
+def to_minutes(t: time) -> int:
+    return t.hour * 60 + t.minute
+
+def to_time(minutes: int) -> time:
+    return time(minutes // 60, minutes % 60)
+
+class IntervalIndex:
+    """Busy intervals per key (e.g. profesional/fecha) as sorted, merged,
+    half-open [start, end) minute ranges, so lookups are a bisect."""
+
+    def __init__(self):
+        self._starts = {}
+        self._ends = {}
+
+    def add(self, key, start: int, end: int):
+        starts = self._starts.setdefault(key, [])
+        ends = self._ends.setdefault(key, [])
+        lo = bisect_right(ends, start)
+        hi = bisect_left(starts, end)
+        if lo < hi:
+            start = min(start, starts[lo])
+            end = max(end, ends[hi - 1])
+        starts[lo:hi] = [start]
+        ends[lo:hi] = [end]
+
+    def overlaps(self, key, start: int, end: int) -> bool:
+        starts = self._starts.get(key)
+        if not starts:
+            return False
+        i = bisect_right(self._ends[key], start)
+        return i < len(starts) and starts[i] < end
+
+    def free_slots(self, key, opening: int, closing: int, duration: int, step: int):
+        starts = self._starts.get(key, [])
+        ends = self._ends.get(key, [])
+        # Only the busy intervals that intersect the opening hours matter
+        i = bisect_right(ends, opening)
+        cursor = opening
+        while cursor + duration <= closing:
+            if i < len(starts) and starts[i] < cursor + duration:
+                # Skip past the blocking interval and snap back onto the step grid
+                cursor = max(cursor, opening + -(-(ends[i] - opening) // step) * step)
+                i += 1
+                continue
+            yield cursor
+            cursor += step
@@ -0,0 +1,201 @@
+import asyncio
+import logging
+import os
+import random
+import time
+from datetime import datetime, timedelta, timezone
+from itertools import groupby
+
+import orjson
+from sqlalchemy import and_, delete, or_, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from bulk import CHUNK_SIZE, chunked
+from database import AsyncWriteSessionLocal
+from models import Job
+
+logger = logging.getLogger(__name__)
+
+JOBS_ENABLED = os.getenv("JOBS_ENABLED", "true").lower() == "true"
+# Batches running at once, across every job kind
+CONCURRENCY = int(os.getenv("JOB_CONCURRENCY", "4"))
+# Jobs taken from the table per round
+CLAIM_SIZE = int(os.getenv("JOB_CLAIM_SIZE", "500"))
+POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", "1"))
+# A job still running after this long is assumed lost with its worker and runs again
+LEASE_SECONDS = int(os.getenv("JOB_LEASE_SECONDS", "300"))
+MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "5"))
+BACKOFF_SECONDS = float(os.getenv("JOB_BACKOFF_SECONDS", "30"))
+BACKOFF_MAX_SECONDS = float(os.getenv("JOB_BACKOFF_MAX_SECONDS", "3600"))
+RETENTION_SECONDS = int(os.getenv("JOB_RETENTION_SECONDS", str(7 * 24 * 3600)))
+PRUNE_SECONDS = 3600
+
+class BatchError(Exception):
+    """Raised by a handler when only some jobs of its batch failed.
+
+    ``failed`` maps positions in the batch to an error message; the other
+    jobs count as done."""
+
+    def __init__(self, failed: dict):
+        super().__init__(f"{len(failed)} jobs failed")
+        self.failed = failed
+
+class Handler:
+    def __init__(self, kind: str, fn, batch_size: int):
+        self.kind = kind
+        self.fn = fn
+        self.batch_size = batch_size
+
+HANDLERS = {}
+
+def handler(kind: str, batch_size: int = 1):
+    """Registers ``fn(payloads)`` to run jobs of ``kind``, up to
+    ``batch_size`` payloads per call."""
+    def register(fn):
+        HANDLERS[kind] = Handler(kind, fn, batch_size)
+        return fn
+    return register
+
+def utcnow() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+def backoff(attempts: int) -> float:
+    # Exponential with jitter, so jobs that failed together do not retry together
+    return min(BACKOFF_MAX_SECONDS, BACKOFF_SECONDS * 2 ** (attempts - 1)) * random.uniform(0.5, 1)
+
+def job(kind: str, payload: dict, run_at: datetime = None, dedupe_key: str = None, max_attempts: int = MAX_ATTEMPTS) -> dict:
+    return {
+        "kind": kind,
+        "payload": orjson.dumps(payload).decode(),
+        "dedupe_key": dedupe_key,
+        "status": "pending",
+        "attempts": 0,
+        "max_attempts": max_attempts,
+        "run_at": run_at or utcnow(),
+    }
+
+async def enqueue(db: AsyncSession, jobs):
+    """Adds ``job()`` rows in the caller's transaction, so they exist only
+    if the work that scheduled them commits. Rows whose dedupe_key is
+    already queued are skipped."""
+    insert = postgresql.insert if db.bind.dialect.name == "postgresql" else sqlite.insert
+    statement = insert(Job).on_conflict_do_nothing(index_elements=[Job.dedupe_key])
+    for chunk in chunked(jobs, CHUNK_SIZE):
+        await db.execute(statement, chunk)
+
+class JobQueue:
+    """Runs due jobs from the jobs table in this process.
+
+    Every worker can run one: jobs are claimed under a lease in one
+    transaction, with SKIP LOCKED on PostgreSQL, so each runs once."""
+
+    def __init__(self, session_factory=AsyncWriteSessionLocal, concurrency: int = CONCURRENCY, claim_size: int = CLAIM_SIZE):
+        self.session_factory = session_factory
+        self.concurrency = concurrency
+        self.claim_size = claim_size
+        self._pruned_at = 0.0
+
+    async def claim(self):
+        now = utcnow()
+        async with self.session_factory() as db:
+            jobs = (await db.execute(
+                select(Job.id, Job.kind, Job.payload, Job.attempts, Job.max_attempts)
+                .filter(or_(
+                    and_(Job.status == "pending", Job.run_at <= now),
+                    and_(Job.status == "running", Job.locked_until < now),
+                ))
+                .order_by(Job.run_at)
+                .limit(self.claim_size)
+                .with_for_update(skip_locked=True)
+            )).all()
+            if not jobs:
+                return [], []
+            # A lease that expired on the last attempt means the job keeps
+            # killing its worker; it is not run again
+            exhausted = [j for j in jobs if j.attempts >= j.max_attempts]
+            jobs = [j for j in jobs if j.attempts < j.max_attempts]
+            values = [
+                {"id": j.id, "status": "running", "attempts": j.attempts + 1, "locked_until": now + timedelta(seconds=LEASE_SECONDS)}
+                for j in jobs
+            ]
+            values.extend(
+                {"id": j.id, "status": "failed", "locked_until": None, "last_error": "Lease expired", "finished_at": now}
+                for j in exhausted
+            )
+            await db.execute(update(Job), values)
+            await db.commit()
+        return jobs, exhausted
+
+    async def _run_batch(self, slots, h, batch):
+        async with slots:
+            try:
+                await h.fn([orjson.loads(j.payload) for j in batch])
+                return {}
+            except BatchError as e:
+                return {batch[i].id: error for i, error in e.failed.items()}
+            except Exception as e:
+                logger.exception("Batch of %d %s jobs failed", len(batch), h.kind)
+                return {j.id: repr(e) for j in batch}
+
+    async def finish(self, jobs, failed: dict, permanent=()):
+        now = utcnow()
+        values = []
+        for j in jobs:
+            # j.attempts is the count before this run's claim
+            attempts = j.attempts + 1
+            error = failed.get(j.id)
+            if error is None:
+                values.append({"id": j.id, "status": "done", "locked_until": None, "last_error": None, "finished_at": now})
+            elif attempts >= j.max_attempts or j.id in permanent:
+                values.append({"id": j.id, "status": "failed", "locked_until": None, "last_error": error, "finished_at": now})
+            else:
+                values.append({"id": j.id, "status": "pending", "locked_until": None, "last_error": error, "run_at": now + timedelta(seconds=backoff(attempts))})
+        async with self.session_factory() as db:
+            await db.execute(update(Job), values)
+            await db.commit()
+
+    async def dispatch(self) -> int:
+        """Runs one round of due jobs; returns how many were claimed."""
+        jobs, exhausted = await self.claim()
+        if not jobs:
+            return len(exhausted)
+
+        slots = asyncio.Semaphore(self.concurrency)
+        tasks = []
+        failed = {}
+        permanent = set()
+        for kind, group in groupby(sorted(jobs, key=lambda j: j.kind), key=lambda j: j.kind):
+            group = list(group)
+            h = HANDLERS.get(kind)
+            if h is None:
+                failed.update((j.id, f"No handler for {kind}") for j in group)
+                permanent.update(j.id for j in group)
+                continue
+            tasks.extend(self._run_batch(slots, h, batch) for batch in chunked(group, h.batch_size))
+        for result in await asyncio.gather(*tasks):
+            failed.update(result)
+
+        await self.finish(jobs, failed, permanent)
+        return len(jobs) + len(exhausted)
+
+    async def prune(self):
+        limite = utcnow() - timedelta(seconds=RETENTION_SECONDS)
+        async with self.session_factory() as db:
+            await db.execute(delete(Job).filter(Job.status.in_(("done", "failed")), Job.finished_at < limite))
+            await db.commit()
+
+    async def run(self, interval: float = POLL_SECONDS):
+        while True:
+            try:
+                # Keeps going while there is a backlog; sleeps once it is drained
+                if await self.dispatch() == 0:
+                    if time.monotonic() - self._pruned_at > PRUNE_SECONDS:
+                        await self.prune()
+                        self._pruned_at = time.monotonic()
+                    await asyncio.sleep(interval)
+            except Exception:
+                logger.exception("Dispatching jobs failed")
+                await asyncio.sleep(interval)
+
+queue = JobQueue()
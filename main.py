@@ -1,21 +1,65 @@
+import asyncio
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 
-from routers import auth, pacientes, users, profesionales, tratamientos, reservas
-import models
-from database import engine
+from routers import auth, pacientes, users, profesionales, tratamientos, reservas, reportes
+import archivo
+import events
+import idempotency
+import jobs
+import metrics
+import ratelimit
+import reporting
+import schema
+from database import async_engine, async_write_engine, engine
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    tasks = []
+    if reporting.REFRESH_SECONDS > 0:
+        tasks.append(asyncio.create_task(reporting.run_refresher(reporting.REFRESH_SECONDS)))
+    if hasattr(events.broker, "run"):
+        tasks.append(asyncio.create_task(events.broker.run()))
+    if jobs.JOBS_ENABLED:
+        await archivo.programar_archivo()
+        tasks.append(asyncio.create_task(jobs.queue.run()))
+    yield
+    for task in tasks:
+        task.cancel()
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan, default_response_class=ORJSONResponse)
 
 origins = ["*"]
 
-app.add_middleware(CORSMiddleware, allow_origins=origins, allow_credentials=True, allow_methods=["*"], allow_headers=["*"])
+if idempotency.IDEMPOTENCY_ENABLED:
+    # Inside the rate limiter, so replayed retries still count against the budget
+    app.add_middleware(idempotency.IdempotencyMiddleware)
+
+if ratelimit.RATE_LIMIT_ENABLED:
+    # Inside CORS, so browsers can read the 429s
+    app.add_middleware(ratelimit.RateLimitMiddleware)
+
+# Browser clients need ETag for If-Match, and Retry-After on 409 and 429
+app.add_middleware(CORSMiddleware, allow_origins=origins, allow_credentials=True, allow_methods=["*"], allow_headers=["*"],
+                   expose_headers=["ETag", "Retry-After", "Idempotent-Replayed"])
+
+if metrics.METRICS_ENABLED:
+    app.add_middleware(metrics.MetricsMiddleware)
+    metrics.instrument_engine(engine)
+    metrics.instrument_engine(async_engine.sync_engine)
+    if async_write_engine is not async_engine:
+        metrics.instrument_engine(async_write_engine.sync_engine)
 
-models.Base.metadata.create_all(bind=engine)
+schema.ensure_schema(engine)
 
 app.include_router(auth.router)
 app.include_router(pacientes.router)
 app.include_router(users.router)
 app.include_router(profesionales.router)
 app.include_router(tratamientos.router)
-app.include_router(reservas.router)
\ No newline at end of file
+app.include_router(reservas.router)
+app.include_router(reportes.router)
+app.include_router(metrics.router)
\ No newline at end of file
@@ -0,0 +1,177 @@
+import bisect
+import logging
+import os
+import re
+import threading
+import time
+from contextvars import ContextVar
+
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from sqlalchemy import event
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+SLOW_QUERY_SECONDS = float(os.getenv("SLOW_QUERY_SECONDS", "0.2"))
+# Statement count above which a request is logged as a likely N+1
+MAX_STATEMENTS_PER_REQUEST = int(os.getenv("MAX_STATEMENTS_PER_REQUEST", "50"))
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STATEMENT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 250)
+
+slow_query_logger = logging.getLogger("sql.slow")
+logger = logging.getLogger(__name__)
+
+router = APIRouter(tags=["metrics"])
+
+class Histogram:
+    """Prometheus histogram keyed on a tuple of label values."""
+
+    def __init__(self, name: str, help: str, labels, buckets):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, labels, value: float):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                # One slot per bucket plus +Inf, then the running sum
+                series = self._series[labels] = [0] * (len(self.buckets) + 2)
+            series[index] += 1
+            series[-1] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {labels: list(counts) for labels, counts in self._series.items()}
+        for labels, counts in sorted(series.items()):
+            label_text = ",".join(f'{k}="{_escape(v)}"' for k, v in zip(self.labels, labels))
+            cumulative = 0
+            for bound, count in zip((*self.buckets, "+Inf"), counts):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{label_text},le="{bound}"}} {cumulative}')
+            lines.append(f"{self.name}_sum{{{label_text}}} {counts[-1]}")
+            lines.append(f"{self.name}_count{{{label_text}}} {cumulative}")
+        return lines
+
+class Counter:
+    def __init__(self, name: str, help: str):
+        self.name = name
+        self.help = help
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self):
+        with self._lock:
+            self.value += 1
+
+    def render(self):
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter", f"{self.name} {self.value}"]
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+request_duration = Histogram(
+    "http_request_duration_seconds", "Time from request start to the last body chunk.",
+    ("method", "route", "status"), LATENCY_BUCKETS,
+)
+request_statements = Histogram(
+    "http_request_db_statements", "SQL statements executed per request.",
+    ("method", "route"), STATEMENT_BUCKETS,
+)
+request_db_duration = Histogram(
+    "http_request_db_seconds", "Time spent in SQL statements per request.",
+    ("method", "route"), LATENCY_BUCKETS,
+)
+slow_queries = Counter("db_slow_queries_total", "Statements slower than SLOW_QUERY_SECONDS.")
+
+REGISTRY = [request_duration, request_statements, request_db_duration, slow_queries]
+
+class RequestStats:
+    __slots__ = ("statements", "db_seconds")
+
+    def __init__(self):
+        self.statements = 0
+        self.db_seconds = 0.0
+
+# Set by the middleware; SQLAlchemy copies the context into the greenlet that
+# runs async statements, so the hooks below see the same object
+_request_stats: ContextVar = ContextVar("request_stats", default=None)
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context._metrics_start = time.perf_counter()
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - context._metrics_start
+    stats = _request_stats.get()
+    if stats is not None:
+        stats.statements += 1
+        stats.db_seconds += elapsed
+    if elapsed >= SLOW_QUERY_SECONDS:
+        slow_queries.inc()
+        # Only the statement text is logged; bound parameters can hold
+        # patient data and are never written out
+        slow_query_logger.warning(
+            "Slow query (%.1f ms%s, parameters redacted): %s",
+            elapsed * 1000, ", executemany" if executemany else "", re.sub(r"\s+", " ", statement).strip(),
+        )
+
+def instrument_engine(engine):
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+def uninstrument_engine(engine):
+    event.remove(engine, "before_cursor_execute", _before_cursor_execute)
+    event.remove(engine, "after_cursor_execute", _after_cursor_execute)
+
+class MetricsMiddleware:
+    """Times every HTTP request and adds a Server-Timing header with its SQL
+    statement count and database time."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        stats = RequestStats()
+        token = _request_stats.set(stats)
+        start = time.perf_counter()
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                timing = f'db;dur={stats.db_seconds * 1000:.1f};desc="{stats.statements} statements", app;dur={(time.perf_counter() - start) * 1000:.1f}'
+                message["headers"] = [*message.get("headers", ()), (b"server-timing", timing.encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _request_stats.reset(token)
+            # Route templates rather than raw paths keep label cardinality bounded
+            route = scope.get("route")
+            path = route.path if route is not None else "unmatched"
+            method = scope["method"]
+            request_duration.observe((method, path, str(status_code)), time.perf_counter() - start)
+            request_statements.observe((method, path), stats.statements)
+            request_db_duration.observe((method, path), stats.db_seconds)
+            if stats.statements > MAX_STATEMENTS_PER_REQUEST:
+                logger.warning("%s %s ran %d SQL statements", method, path, stats.statements)
+
+def render() -> str:
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+@router.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    return PlainTextResponse(render(), media_type="text/plain; version=0.0.4")
@@ -0,0 +1,44 @@
+from logging.config import fileConfig
+
+from alembic import context
+from sqlalchemy import create_engine
+
+import models
+from database import SQLALCHEMY_DATABASE_URL
+
+config = context.config
+if config.config_file_name is not None and config.attributes.get("configure_logger", True):
+    fileConfig(config.config_file_name)
+
+# schema.upgrade passes the URL it was given; the command line uses DATABASE_URL
+url = config.attributes.get("url", SQLALCHEMY_DATABASE_URL)
+
+target_metadata = models.Base.metadata
+
+def include_object(object, name, type_, reflected, compare_to):
+    # The FTS5 table and its shadow tables are managed by 0003, not the models
+    return not (type_ == "table" and name.startswith("pacientes_fts"))
+
+def run_migrations_offline():
+    context.configure(url=url, target_metadata=target_metadata, literal_binds=True, render_as_batch=True)
+    with context.begin_transaction():
+        context.run_migrations()
+
+def run_migrations_online():
+    # A plain engine without the app's pragmas: foreign keys stay off while
+    # SQLite tables are rebuilt in batch mode
+    connectable = create_engine(url)
+    with connectable.connect() as connection:
+        context.configure(
+            connection=connection,
+            target_metadata=target_metadata,
+            include_object=include_object,
+            render_as_batch=connection.dialect.name == "sqlite",
+        )
+        with context.begin_transaction():
+            context.run_migrations()
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
@@ -0,0 +1,75 @@
+"""Initial schema
+
+The tables as the first release created them with metadata.create_all.
+Databases created that way already have them: mark them with
+``alembic stamp 0001`` and upgrade from there.
+
+Revision ID: 0001
+Revises:
+Create Date: 2025-03-05 00:00:00
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from guid import GUID
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_table(
+        "users",
+        sa.Column("id", GUID(), primary_key=True),
+        sa.Column("email", sa.String(), nullable=False, unique=True),
+        sa.Column("hashed_password", sa.String(), nullable=False),
+        sa.Column("role", sa.Enum("admin", "recepcionista", name="user_roles"), nullable=False),
+        sa.Column("created_at", sa.TIMESTAMP(), server_default=sa.func.now()),
+    )
+    op.create_table(
+        "profesionales",
+        sa.Column("id", GUID(), primary_key=True),
+        sa.Column("nombre_completo", sa.String(), nullable=False),
+        sa.Column("tipo", sa.Enum("enfermera", "ayudante", name="profesional_tipo"), nullable=False),
+        sa.Column("created_at", sa.TIMESTAMP(), server_default=sa.func.now()),
+    )
+    op.create_table(
+        "tratamientos",
+        sa.Column("id", GUID(), primary_key=True),
+        sa.Column("nombre", sa.String(), nullable=False, unique=True),
+        sa.Column("descripcion", sa.String()),
+        sa.Column("duracion_minutos", sa.Integer(), nullable=False),
+        sa.Column("precio", sa.DECIMAL(10, 2), nullable=False),
+        sa.Column("created_at", sa.TIMESTAMP(), server_default=sa.func.now()),
+    )
+    op.create_table(
+        "pacientes",
+        sa.Column("id", GUID(), primary_key=True),
+        sa.Column("nombre", sa.String(), nullable=False),
+        sa.Column("apellido", sa.String(), nullable=False),
+        sa.Column("email", sa.String(), unique=True),
+        sa.Column("telefono", sa.String(), nullable=False),
+        sa.Column("fecha_nacimiento", sa.Date()),
+        sa.Column("created_at", sa.TIMESTAMP(), server_default=sa.func.now()),
+    )
+    op.create_table(
+        "reservas",
+        sa.Column("id", GUID(), primary_key=True),
+        sa.Column("fecha", sa.Date(), nullable=False),
+        sa.Column("hora_inicio", sa.Time(), nullable=False),
+        sa.Column("hora_fin", sa.Time(), nullable=False),
+        sa.Column("atencion", sa.Enum("agendada", "confirmada", "espera", "atendida", name="reservas_atencion"), nullable=False),
+        sa.Column("pago", sa.Enum("listo", "pendiente", name="reservas_pago"), nullable=False),
+        sa.Column("created_at", sa.TIMESTAMP(), server_default=sa.func.now()),
+        sa.Column("paciente_id", GUID(), sa.ForeignKey("pacientes.id", ondelete="CASCADE"), nullable=False),
+        sa.Column("profesional_id", GUID(), sa.ForeignKey("profesionales.id", ondelete="CASCADE"), nullable=False),
+        sa.Column("tratamiento_id", GUID(), sa.ForeignKey("tratamientos.id", ondelete="CASCADE"), nullable=False),
+    )
+
+def downgrade():
+    for table in ("reservas", "pacientes", "tratamientos", "profesionales", "users"):
+        op.drop_table(table)
+    if op.get_bind().dialect.name == "postgresql":
+        for enum in ("reservas_pago", "reservas_atencion", "profesional_tipo", "user_roles"):
+            sa.Enum(name=enum).drop(op.get_bind(), checkfirst=True)
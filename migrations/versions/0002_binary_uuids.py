@@ -0,0 +1,64 @@
+"""Store UUIDs as 16-byte blobs on SQLite
+
+Rewrites every UUID key from 32-character hex text to raw bytes, halving
+the key columns and every index over them. Rows already converted are
+left alone, so the migration is safe on databases that were created with
+binary storage. PostgreSQL keeps its native uuid columns and is not
+touched.
+
+With UUID_STORAGE=text the rows are left as text. To convert such a
+database later, run ``alembic downgrade 0001`` and upgrade again without
+UUID_STORAGE=text.
+
+The freed pages are only returned to the filesystem by running VACUUM,
+which cannot run inside the migration's transaction.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2025-10-17 00:00:00
+"""
+import uuid
+
+from alembic import op
+import sqlalchemy as sa
+
+import guid
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+# Report tables only exist once the app has created them
+UUID_COLUMNS = {
+    "users": ["id"],
+    "profesionales": ["id"],
+    "tratamientos": ["id"],
+    "pacientes": ["id"],
+    "reservas": ["id", "paciente_id", "profesional_id", "tratamiento_id"],
+    "reporte_utilizacion_diaria": ["profesional_id"],
+    "reporte_ingresos_diarios": ["tratamiento_id"],
+}
+
+def _convert(function, source_type):
+    bind = op.get_bind()
+    if bind.dialect.name != "sqlite":
+        return
+    bind.connection.dbapi_connection.create_function("convert_uuid", 1, function, deterministic=True)
+    # Keys and the foreign keys pointing at them are rewritten one table at a
+    # time; deferring the checks to commit keeps them from firing in between
+    bind.exec_driver_sql("PRAGMA defer_foreign_keys = ON")
+    inspector = sa.inspect(bind)
+    for table, columns in UUID_COLUMNS.items():
+        if not inspector.has_table(table):
+            continue
+        for column in columns:
+            bind.exec_driver_sql(f"UPDATE {table} SET {column} = convert_uuid({column}) WHERE typeof({column}) = '{source_type}'")
+
+def upgrade():
+    if guid.UUID_STORAGE == "text":
+        return
+    _convert(lambda value: uuid.UUID(value).bytes, "text")
+
+def downgrade():
+    _convert(lambda value: uuid.UUID(bytes=value).hex, "blob")
@@ -0,0 +1,88 @@
+"""Report, cache and event tables, reservas indexes and patient search
+
+Everything the app used to add with metadata.create_all and
+search.ensure_search_index after the first release. create_all never
+added indexes to an existing reservas table, so older databases lack
+them. Databases that already have some of these objects keep them; only
+missing ones are created.
+
+The report tables start empty on databases that already have reservas;
+0008 fills them.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2025-10-17 00:00:00
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from guid import GUID
+import search
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+RESERVAS_INDEXES = {
+    "ix_reservas_fecha_hora_inicio": ["fecha", "hora_inicio"],
+    "ix_reservas_profesional_fecha": ["profesional_id", "fecha"],
+    "ix_reservas_paciente_fecha": ["paciente_id", "fecha"],
+    "ix_reservas_tratamiento_fecha": ["tratamiento_id", "fecha"],
+}
+
+def upgrade():
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+
+    if not inspector.has_table("cache_versions"):
+        op.create_table(
+            "cache_versions",
+            sa.Column("name", sa.String(), primary_key=True),
+            sa.Column("version", sa.Integer(), nullable=False),
+        )
+    if not inspector.has_table("agenda_eventos"):
+        op.create_table(
+            "agenda_eventos",
+            sa.Column("id", sa.Integer(), primary_key=True, autoincrement=True),
+            sa.Column("canales", sa.String(), nullable=False),
+            sa.Column("payload", sa.String(), nullable=False),
+            sa.Column("created_at", sa.TIMESTAMP(), server_default=sa.func.now()),
+        )
+    if not inspector.has_table("reporte_utilizacion_diaria"):
+        op.create_table(
+            "reporte_utilizacion_diaria",
+            sa.Column("fecha", sa.Date(), primary_key=True),
+            sa.Column("profesional_id", GUID(), primary_key=True),
+            sa.Column("minutos_reservados", sa.Integer(), nullable=False),
+            sa.Column("reservas", sa.Integer(), nullable=False),
+        )
+    if not inspector.has_table("reporte_ingresos_diarios"):
+        op.create_table(
+            "reporte_ingresos_diarios",
+            sa.Column("fecha", sa.Date(), primary_key=True),
+            sa.Column("tratamiento_id", GUID(), primary_key=True),
+            sa.Column("pago", sa.String(), primary_key=True),
+            sa.Column("ingreso", sa.DECIMAL(12, 2), nullable=False),
+            sa.Column("reservas", sa.Integer(), nullable=False),
+        )
+
+    existing = {index["name"] for index in inspector.get_indexes("reservas")}
+    for name, columns in RESERVAS_INDEXES.items():
+        if name not in existing:
+            op.create_index(name, "reservas", columns)
+
+    search.ensure_search_index(bind)
+
+def downgrade():
+    bind = op.get_bind()
+    if bind.dialect.name == "sqlite":
+        for trigger in ("pacientes_fts_insert", "pacientes_fts_delete", "pacientes_fts_update"):
+            op.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+        op.execute("DROP TABLE IF EXISTS pacientes_fts")
+    elif bind.dialect.name == "postgresql":
+        op.execute("DROP INDEX IF EXISTS ix_pacientes_busqueda_trgm")
+    for name in RESERVAS_INDEXES:
+        op.drop_index(name, table_name="reservas")
+    for table in ("reporte_ingresos_diarios", "reporte_utilizacion_diaria", "agenda_eventos", "cache_versions"):
+        op.drop_table(table)
@@ -0,0 +1,49 @@
+"""Soft-deleted reservas and the reservas archive
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2025-10-17 00:00:00
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+from guid import GUID
+
+revision = "0005"
+down_revision = "0004"
+branch_labels = None
+depends_on = None
+
+INDEXES = {
+    "ix_reservas_archivadas_fecha_hora_inicio": ["fecha", "hora_inicio"],
+    "ix_reservas_archivadas_profesional_fecha": ["profesional_id", "fecha"],
+    "ix_reservas_archivadas_paciente_fecha": ["paciente_id", "fecha"],
+    "ix_reservas_archivadas_tratamiento_fecha": ["tratamiento_id", "fecha"],
+}
+
+def upgrade():
+    op.add_column("reservas", sa.Column("deleted_at", sa.TIMESTAMP()))
+    # The enum types already exist on PostgreSQL; 0001 created them with reservas
+    op.create_table(
+        "reservas_archivadas",
+        sa.Column("id", GUID(), primary_key=True),
+        sa.Column("fecha", sa.Date(), nullable=False),
+        sa.Column("hora_inicio", sa.Time(), nullable=False),
+        sa.Column("hora_fin", sa.Time(), nullable=False),
+        sa.Column("atencion", postgresql.ENUM("agendada", "confirmada", "espera", "atendida", name="reservas_atencion", create_type=False), nullable=False),
+        sa.Column("pago", postgresql.ENUM("listo", "pendiente", name="reservas_pago", create_type=False), nullable=False),
+        sa.Column("created_at", sa.TIMESTAMP()),
+        sa.Column("deleted_at", sa.TIMESTAMP()),
+        sa.Column("archived_at", sa.TIMESTAMP(), server_default=sa.func.now()),
+        sa.Column("paciente_id", GUID(), nullable=False),
+        sa.Column("profesional_id", GUID(), nullable=False),
+        sa.Column("tratamiento_id", GUID(), nullable=False),
+    )
+    for name, columns in INDEXES.items():
+        op.create_index(name, "reservas_archivadas", columns)
+
+def downgrade():
+    op.drop_table("reservas_archivadas")
+    with op.batch_alter_table("reservas") as batch:
+        batch.drop_column("deleted_at")
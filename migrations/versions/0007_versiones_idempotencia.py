@@ -0,0 +1,37 @@
+"""Row versions for optimistic locking and the idempotency key store
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2025-10-17 00:00:00
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0007"
+down_revision = "0006"
+branch_labels = None
+depends_on = None
+
+VERSIONED = ("tratamientos", "pacientes", "reservas", "reservas_archivadas")
+
+def upgrade():
+    # Plain ADD COLUMN on SQLite too: rebuilding pacientes would drop its
+    # full-text search triggers
+    for table in VERSIONED:
+        op.add_column(table, sa.Column("version", sa.Integer(), nullable=False, server_default="1"))
+    op.create_table(
+        "idempotency_keys",
+        sa.Column("key", sa.String(), primary_key=True),
+        sa.Column("fingerprint", sa.String()),
+        sa.Column("status_code", sa.Integer()),
+        sa.Column("headers", sa.String()),
+        sa.Column("body", sa.LargeBinary()),
+        sa.Column("expires_at", sa.TIMESTAMP(), nullable=False),
+    )
+    op.create_index("ix_idempotency_keys_expires_at", "idempotency_keys", ["expires_at"])
+
+def downgrade():
+    op.drop_index("ix_idempotency_keys_expires_at", table_name="idempotency_keys")
+    op.drop_table("idempotency_keys")
+    for table in VERSIONED:
+        op.drop_column(table, "version")
@@ -0,0 +1,29 @@
+"""Never reuse agenda event ids on SQLite
+
+Without AUTOINCREMENT, SQLite hands out ids from 1 again once the
+retention purge empties agenda_eventos, and every poller skips them as
+already delivered. PostgreSQL sequences never go back, so only SQLite
+tables are rebuilt; existing rows keep their ids.
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2025-10-17 00:00:00
+"""
+from alembic import op
+
+revision = "0009"
+down_revision = "0008"
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    if op.get_bind().dialect.name != "sqlite":
+        return
+    with op.batch_alter_table("agenda_eventos", recreate="always", table_kwargs={"sqlite_autoincrement": True}):
+        pass
+
+def downgrade():
+    if op.get_bind().dialect.name != "sqlite":
+        return
+    with op.batch_alter_table("agenda_eventos", recreate="always", table_kwargs={"sqlite_autoincrement": False}):
+        pass
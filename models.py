@@ -1,21 +1,87 @@
 from database import Base
-from sqlalchemy import Column, Integer, DECIMAL, String, Boolean, ForeignKey, Enum, TIMESTAMP, Date, Time, func
-from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy import Column, Integer, Float, DECIMAL, String, Boolean, LargeBinary, ForeignKey, Enum, TIMESTAMP, Date, Time, Index, func
+from guid import GUID
 import uuid
 
 class User(Base):
     __tablename__ = 'users'
 
-    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    id = Column(GUID(), primary_key=True, default=uuid.uuid4)
     email = Column(String, unique=True, nullable=False)
     hashed_password = Column(String, nullable=False)
     role = Column(Enum("admin", "recepcionista", name="user_roles"), nullable=False)
     created_at = Column(TIMESTAMP, server_default=func.now())
 
+class CacheVersion(Base):
+    __tablename__ = "cache_versions"
+
+    name = Column(String, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+
+class AgendaEvento(Base):
+    __tablename__ = "agenda_eventos"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    canales = Column(String, nullable=False)
+    payload = Column(String, nullable=False)
+    created_at = Column(TIMESTAMP, server_default=func.now())
+
+    # Ids must keep growing after the retention purge empties the table;
+    # pollers only read rows above the last id they delivered
+    __table_args__ = {"sqlite_autoincrement": True}
+
+class RateLimitBucket(Base):
+    __tablename__ = "rate_limit_buckets"
+
+    key = Column(String, primary_key=True)
+    tokens = Column(Float, nullable=False)
+    # Epoch seconds, so the refill is plain arithmetic on both dialects
+    updated_at = Column(Float, nullable=False)
+
+    __table_args__ = (
+        Index("ix_rate_limit_buckets_updated_at", "updated_at"),
+    )
+
+class IdempotencyKey(Base):
+    __tablename__ = "idempotency_keys"
+
+    key = Column(String, primary_key=True)
+    fingerprint = Column(String)
+    # Null while the first request is still running
+    status_code = Column(Integer)
+    headers = Column(String)
+    body = Column(LargeBinary)
+    expires_at = Column(TIMESTAMP, nullable=False)
+
+    __table_args__ = (
+        Index("ix_idempotency_keys_expires_at", "expires_at"),
+    )
+
+class Job(Base):
+    __tablename__ = "jobs"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    kind = Column(String, nullable=False)
+    payload = Column(String, nullable=False)
+    # Enqueuing the same key twice keeps the first job only
+    dedupe_key = Column(String, unique=True)
+    status = Column(String, nullable=False, default="pending")
+    attempts = Column(Integer, nullable=False, default=0)
+    max_attempts = Column(Integer, nullable=False)
+    run_at = Column(TIMESTAMP, nullable=False)
+    locked_until = Column(TIMESTAMP)
+    last_error = Column(String)
+    created_at = Column(TIMESTAMP, server_default=func.now())
+    finished_at = Column(TIMESTAMP)
+
+    __table_args__ = (
+        Index("ix_jobs_status_run_at", "status", "run_at"),
+    )
+
 class Profesional(Base):
     __tablename__ = "profesionales"
 
-    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    id = Column(GUID(), primary_key=True, default=uuid.uuid4)
     nombre_completo = Column(String, nullable=False)
     tipo = Column(Enum("enfermera", "ayudante", name="profesional_tipo"), nullable=False)
     created_at = Column(TIMESTAMP, server_default=func.now())
@@ -23,35 +89,101 @@ class Profesional(Base):
 class Tratamiento(Base):
     __tablename__ = "tratamientos"
 
-    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    id = Column(GUID(), primary_key=True, default=uuid.uuid4)
     nombre = Column(String, unique=True, nullable=False)
     descripcion = Column(String)
     duracion_minutos = Column(Integer, nullable=False)
     precio = Column(DECIMAL(10,2), nullable=False)
     created_at = Column(TIMESTAMP, server_default=func.now())
+    version = Column(Integer, nullable=False, server_default="1")
+
+    # Updates check and bump the version, so a stale write fails instead of
+    # overwriting the row; the version is served as the ETag. Eager defaults
+    # read created_at back through RETURNING, so a create can answer with
+    # the row without another query
+    __mapper_args__ = {"version_id_col": version, "eager_defaults": True}
 
 class Paciente(Base):
     __tablename__ = "pacientes"
 
-    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    id = Column(GUID(), primary_key=True, default=uuid.uuid4)
     nombre = Column(String, nullable=False)
     apellido = Column(String, nullable=False)
     email = Column(String, unique=True)
     telefono = Column(String, nullable=False)
     fecha_nacimiento = Column(Date)
     created_at = Column(TIMESTAMP, server_default=func.now())
+    version = Column(Integer, nullable=False, server_default="1")
+
+    __mapper_args__ = {"version_id_col": version, "eager_defaults": True}
 
 class Reserva(Base):
     __tablename__ = "reservas"
 
-    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    id = Column(GUID(), primary_key=True, default=uuid.uuid4)
     fecha = Column(Date, nullable=False)
     hora_inicio = Column(Time, nullable=False)
     hora_fin = Column(Time, nullable=False)
     atencion = Column(Enum("agendada", "confirmada", "espera", "atendida", name="reservas_atencion"), nullable=False, default="confirmada")
     pago = Column(Enum("listo", "pendiente", name="reservas_pago"), nullable=False, default="pendiente")
     created_at = Column(TIMESTAMP, server_default=func.now())
+    # Set instead of deleting the row; every read filters on it
+    deleted_at = Column(TIMESTAMP)
+    version = Column(Integer, nullable=False, server_default="1")
+
+    paciente_id = Column(GUID(), ForeignKey("pacientes.id", ondelete="CASCADE"), nullable=False)
+    profesional_id = Column(GUID(), ForeignKey("profesionales.id", ondelete="CASCADE"), nullable=False)
+    tratamiento_id = Column(GUID(), ForeignKey("tratamientos.id", ondelete="CASCADE"), nullable=False)
+
+    __table_args__ = (
+        Index("ix_reservas_fecha_hora_inicio", "fecha", "hora_inicio"),
+        Index("ix_reservas_profesional_fecha", "profesional_id", "fecha"),
+        Index("ix_reservas_paciente_fecha", "paciente_id", "fecha"),
+        Index("ix_reservas_tratamiento_fecha", "tratamiento_id", "fecha"),
+    )
+    __mapper_args__ = {"version_id_col": version, "eager_defaults": True}
+
+class ReservaArchivada(Base):
+    """Reservas moved out of the hot table by archivo.archivar. No foreign
+    keys: deleting a paciente, profesional or tratamiento removes its rows
+    here explicitly."""
+    __tablename__ = "reservas_archivadas"
+
+    id = Column(GUID(), primary_key=True)
+    fecha = Column(Date, nullable=False)
+    hora_inicio = Column(Time, nullable=False)
+    hora_fin = Column(Time, nullable=False)
+    atencion = Column(Enum("agendada", "confirmada", "espera", "atendida", name="reservas_atencion"), nullable=False)
+    pago = Column(Enum("listo", "pendiente", name="reservas_pago"), nullable=False)
+    created_at = Column(TIMESTAMP)
+    deleted_at = Column(TIMESTAMP)
+    version = Column(Integer, nullable=False, server_default="1")
+    archived_at = Column(TIMESTAMP, server_default=func.now())
+
+    paciente_id = Column(GUID(), nullable=False)
+    profesional_id = Column(GUID(), nullable=False)
+    tratamiento_id = Column(GUID(), nullable=False)
+
+    __table_args__ = (
+        Index("ix_reservas_archivadas_fecha_hora_inicio", "fecha", "hora_inicio"),
+        Index("ix_reservas_archivadas_profesional_fecha", "profesional_id", "fecha"),
+        Index("ix_reservas_archivadas_paciente_fecha", "paciente_id", "fecha"),
+        Index("ix_reservas_archivadas_tratamiento_fecha", "tratamiento_id", "fecha"),
+    )
+
+class UtilizacionDiaria(Base):
+    __tablename__ = "reporte_utilizacion_diaria"
+
+    fecha = Column(Date, primary_key=True)
+    profesional_id = Column(GUID(), primary_key=True)
+    minutos_reservados = Column(Integer, nullable=False)
+    reservas = Column(Integer, nullable=False)
+
+class IngresoDiario(Base):
+    __tablename__ = "reporte_ingresos_diarios"
 
-    paciente_id = Column(UUID(as_uuid=True), ForeignKey("pacientes.id", ondelete="CASCADE"), nullable=False)
-    profesional_id = Column(UUID(as_uuid=True), ForeignKey("profesionales.id", ondelete="CASCADE"), nullable=False)
-    tratamiento_id = Column(UUID(as_uuid=True), ForeignKey("tratamientos.id", ondelete="CASCADE"), nullable=False)
+    fecha = Column(Date, primary_key=True)
+    tratamiento_id = Column(GUID(), primary_key=True)
+    pago = Column(String, primary_key=True)
+    ingreso = Column(DECIMAL(12,2), nullable=False)
+    reservas = Column(Integer, nullable=False)
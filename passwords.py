@@ -0,0 +1,52 @@
+import asyncio
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from fastapi import HTTPException
+from passlib.context import CryptContext
+from starlette import status
+
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(os.cpu_count() or 1)))
+HASH_QUEUE_SIZE = int(os.getenv("PASSWORD_HASH_QUEUE_SIZE", "32"))
+RETRY_AFTER_SECONDS = 1
+
+# Pinning min/max to the configured cost flags every hash made with another
+# cost, so verify_and_update hands back a rehash after a successful login.
+bcrypt_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__rounds=BCRYPT_ROUNDS,
+    bcrypt__min_rounds=BCRYPT_ROUNDS,
+    bcrypt__max_rounds=BCRYPT_ROUNDS,
+)
+
+# bcrypt releases the GIL while hashing, so a thread pool scales with cores
+_executor = ThreadPoolExecutor(max_workers=HASH_WORKERS, thread_name_prefix="bcrypt")
+_lock = threading.Lock()
+_pending = 0
+
+async def _run(fn, *args):
+    global _pending
+    with _lock:
+        if _pending >= HASH_WORKERS + HASH_QUEUE_SIZE:
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Too many password operations in progress",
+                headers={"Retry-After": str(RETRY_AFTER_SECONDS)},
+            )
+        _pending += 1
+    try:
+        return await asyncio.get_running_loop().run_in_executor(_executor, fn, *args)
+    finally:
+        with _lock:
+            _pending -= 1
+
+async def hash_password(password: str) -> str:
+    return await _run(bcrypt_context.hash, password)
+
+async def verify_password(password: str, hashed_password: str):
+    """Returns ``(valid, new_hash)``; ``new_hash`` is set when the stored hash
+    was made with a different cost and should be replaced."""
+    return await _run(bcrypt_context.verify_and_update, password, hashed_password)
@@ -0,0 +1,186 @@
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from fastapi import HTTPException
+from fastapi.responses import ORJSONResponse
+from sqlalchemy import case, delete, select
+from sqlalchemy.dialects import postgresql, sqlite
+
+from database import AsyncWriteSessionLocal
+from models import RateLimitBucket
+from routers.auth import decode_token
+
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true"
+# Requests a user may have in progress at once in one worker; 0 disables the cap
+MAX_CONCURRENT_REQUESTS = int(os.getenv("RATE_LIMIT_MAX_CONCURRENT", "8"))
+# Buckets kept by the in-memory store; the least recently used go first
+LOCAL_MAX_BUCKETS = int(os.getenv("RATE_LIMIT_MAX_BUCKETS", "100000"))
+# Rows untouched this long are full again and are deleted from the shared store
+PRUNE_AFTER_SECONDS = 3600
+
+class Budget:
+    """``per_minute`` requests on average with bursts of up to ``burst``.
+
+    Buckets are keyed on the user id from the bearer token, or on the
+    client IP when ``by_ip`` is set or the request has no valid token.
+    Long-lived streams set ``streaming`` so an open one does not count
+    against MAX_CONCURRENT_REQUESTS."""
+
+    def __init__(self, name: str, per_minute: float, burst: int, by_ip: bool = False, streaming: bool = False):
+        self.name = name
+        self.rate = per_minute / 60
+        self.burst = burst
+        self.by_ip = by_ip
+        self.streaming = streaming
+
+# Routes not listed share the default budget. Every check of a password
+# runs bcrypt, so those routes get small budgets per client IP
+RATE_LIMITS = {
+    "POST /auth/token": Budget("login", per_minute=10, burst=5, by_ip=True),
+    "POST /auth/": Budget("signup", per_minute=10, burst=5, by_ip=True),
+    "PUT /user/password": Budget("password", per_minute=10, burst=5),
+    "POST /pacientes/bulk": Budget("bulk", per_minute=6, burst=3),
+    "POST /reservas/bulk": Budget("bulk", per_minute=6, burst=3),
+    "GET /pacientes/export": Budget("export", per_minute=6, burst=3),
+    "GET /reservas/export": Budget("export", per_minute=6, burst=3),
+    "POST /reportes/refresh": Budget("refresh", per_minute=2, burst=1),
+    "GET /reservas/eventos": Budget("eventos", per_minute=30, burst=10, streaming=True),
+    "GET /metrics": None,
+}
+DEFAULT_BUDGET = Budget(
+    "default",
+    per_minute=float(os.getenv("RATE_LIMIT_PER_MINUTE", "600")),
+    burst=int(os.getenv("RATE_LIMIT_BURST", "100")),
+)
+
+class LocalRateLimitStore:
+    """Token buckets in this process's memory; with several workers each
+    one enforces the budgets separately."""
+
+    def __init__(self, maxsize: int = LOCAL_MAX_BUCKETS):
+        self.maxsize = maxsize
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    async def take(self, key: str, rate: float, burst: int) -> float:
+        """Takes a token from ``key``'s bucket. Returns 0 when one was
+        available, otherwise the seconds until the next one is."""
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated_at = self._buckets.get(key, (burst, now))
+            tokens = min(burst, tokens + (now - updated_at) * rate)
+            wait = 0.0 if tokens >= 1 else (1 - tokens) / rate
+            self._buckets[key] = (tokens - 1 if wait == 0 else tokens, now)
+            self._buckets.move_to_end(key)
+            # An evicted bucket starts full again, which the least recently
+            # used one almost always is already
+            while len(self._buckets) > self.maxsize:
+                self._buckets.popitem(last=False)
+        return wait
+
+class DatabaseRateLimitStore:
+    """Token buckets in the rate_limit_buckets table, so every worker
+    sharing the database draws from the same budget. Costs one write per
+    request; meant for PostgreSQL deployments with several workers."""
+
+    def __init__(self):
+        self._pruned_at = 0.0
+
+    async def take(self, key: str, rate: float, burst: int) -> float:
+        now = time.time()
+        refilled = RateLimitBucket.tokens + (now - RateLimitBucket.updated_at) * rate
+        refilled = case((refilled > burst, burst), else_=refilled)
+        async with AsyncWriteSessionLocal() as db:
+            insert = postgresql.insert if db.bind.dialect.name == "postgresql" else sqlite.insert
+            # The update, and with it the returned row, only happens while
+            # there is a token to take, all in one atomic statement
+            taken = await db.scalar(
+                insert(RateLimitBucket)
+                .values(key=key, tokens=burst - 1, updated_at=now)
+                .on_conflict_do_update(
+                    index_elements=[RateLimitBucket.key],
+                    set_={"tokens": refilled - 1, "updated_at": now},
+                    where=refilled >= 1,
+                )
+                .returning(RateLimitBucket.key)
+            )
+            wait = 0.0
+            if taken is None:
+                bucket = (await db.execute(
+                    select(RateLimitBucket.tokens, RateLimitBucket.updated_at).filter(RateLimitBucket.key == key)
+                )).one()
+                wait = max(0.0, (1 - bucket.tokens) / rate - (now - bucket.updated_at))
+            if now - self._pruned_at > PRUNE_AFTER_SECONDS:
+                await db.execute(delete(RateLimitBucket).filter(RateLimitBucket.updated_at < now - PRUNE_AFTER_SECONDS))
+                self._pruned_at = now
+            await db.commit()
+        return wait
+
+RATE_LIMIT_STORES = {"local": LocalRateLimitStore, "database": DatabaseRateLimitStore}
+
+store = RATE_LIMIT_STORES[os.getenv("RATE_LIMIT_STORE", "local")]()
+
+def budget_for(method: str, path: str):
+    return RATE_LIMITS.get(f"{method} {path}", DEFAULT_BUDGET)
+
+def client_key(scope, by_ip: bool) -> str:
+    if not by_ip:
+        for name, value in scope["headers"]:
+            if name == b"authorization":
+                token = value.decode("latin-1").removeprefix("Bearer ").strip()
+                try:
+                    # Cached, so get_current_user finds it already decoded
+                    return f"user:{decode_token(token)['id']}"
+                except HTTPException:
+                    break
+    # Behind a reverse proxy, run uvicorn with --proxy-headers so this is
+    # the real client rather than the proxy
+    client = scope.get("client")
+    return f"ip:{client[0] if client else 'unknown'}"
+
+def too_many_requests(wait: float):
+    return ORJSONResponse(
+        {"detail": "Too many requests"},
+        status_code=429,
+        headers={"Retry-After": str(max(1, math.ceil(wait)))},
+    )
+
+class RateLimitMiddleware:
+    """Answers 429 with Retry-After once a client exhausts its route's
+    budget or already has MAX_CONCURRENT_REQUESTS requests in progress."""
+
+    def __init__(self, app, store=None, max_concurrent: int = MAX_CONCURRENT_REQUESTS):
+        self.app = app
+        self.store = store
+        self.max_concurrent = max_concurrent
+        self._in_flight = {}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        budget = budget_for(scope["method"], scope["path"])
+        if budget is None:
+            return await self.app(scope, receive, send)
+
+        key = client_key(scope, budget.by_ip)
+        wait = await (self.store or store).take(f"{budget.name}:{key}", budget.rate, budget.burst)
+        if wait > 0:
+            return await too_many_requests(wait)(scope, receive, send)
+
+        if self.max_concurrent <= 0 or budget.streaming:
+            return await self.app(scope, receive, send)
+        in_flight = self._in_flight.get(key, 0)
+        if in_flight >= self.max_concurrent:
+            return await too_many_requests(1)(scope, receive, send)
+        self._in_flight[key] = in_flight + 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            in_flight = self._in_flight[key] - 1
+            if in_flight:
+                self._in_flight[key] = in_flight
+            else:
+                del self._in_flight[key]
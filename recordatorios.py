@@ -0,0 +1,92 @@
+import logging
+import os
+from datetime import date, datetime, time, timedelta, timezone
+from uuid import UUID
+from zoneinfo import ZoneInfo
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import jobs
+from bulk import IN_CHUNK_SIZE, chunked
+from database import AsyncSessionLocal
+from models import Paciente, Reserva, Tratamiento
+
+logger = logging.getLogger(__name__)
+
+ZONA_HORARIA = ZoneInfo(os.getenv("CLINIC_TIMEZONE", "America/Santiago"))
+# Local time, the day before the reserva
+HORA_ENVIO = time.fromisoformat(os.getenv("REMINDER_TIME", "10:00"))
+# Messages handed to the transport per call
+TAMANO_LOTE = int(os.getenv("REMINDER_BATCH_SIZE", "100"))
+
+class LocalTransport:
+    """Keeps sent messages in memory and logs them; for development and
+    tests. A real transport sends the batch to an SMS or email provider
+    and returns ``{position: error}`` for the messages it rejected."""
+
+    def __init__(self):
+        self.enviados = []
+
+    async def send_batch(self, mensajes) -> dict:
+        self.enviados.extend(mensajes)
+        for mensaje in mensajes:
+            logger.info("Recordatorio para %s: %s", mensaje["telefono"], mensaje["texto"])
+        return {}
+
+TRANSPORTS = {"local": LocalTransport}
+
+transport = TRANSPORTS[os.getenv("REMINDER_TRANSPORT", "local")]()
+
+def hora_envio(fecha: date) -> datetime:
+    """UTC time at which the reminder for a reserva on ``fecha`` is due."""
+    local = datetime.combine(fecha - timedelta(days=1), HORA_ENVIO, tzinfo=ZONA_HORARIA)
+    return local.astimezone(timezone.utc).replace(tzinfo=None)
+
+async def programar_recordatorios(db: AsyncSession, reservas):
+    """Queues a reminder per ``(reserva_id, fecha)`` in the caller's
+    transaction. Reservas from today on get none; a reminder whose time has
+    passed goes out on the next dispatch."""
+    hoy = datetime.now(ZONA_HORARIA).date()
+    await jobs.enqueue(db, [
+        # The date is part of the key, so moving a reserva queues a new reminder
+        jobs.job("recordatorio", {"reserva_id": str(reserva_id), "fecha": fecha.isoformat()},
+                 run_at=hora_envio(fecha), dedupe_key=f"recordatorio:{reserva_id}:{fecha.isoformat()}")
+        for reserva_id, fecha in reservas
+        if fecha > hoy
+    ])
+
+def texto(reserva) -> str:
+    return (f"Hola {reserva.nombre}, te recordamos tu hora de {reserva.tratamiento} "
+            f"el {reserva.fecha.strftime('%d/%m/%Y')} a las {reserva.hora_inicio.strftime('%H:%M')}.")
+
+@jobs.handler("recordatorio", batch_size=TAMANO_LOTE)
+async def enviar_recordatorios(trabajos):
+    ids = {UUID(t["reserva_id"]) for t in trabajos}
+    reservas = {}
+    async with AsyncSessionLocal() as db:
+        for lote in chunked(ids, IN_CHUNK_SIZE):
+            filas = await db.execute(
+                select(Reserva.id, Reserva.fecha, Reserva.hora_inicio, Paciente.nombre, Paciente.telefono,
+                       Paciente.email, Tratamiento.nombre.label("tratamiento"))
+                .join(Paciente, Reserva.paciente_id == Paciente.id)
+                .join(Tratamiento, Reserva.tratamiento_id == Tratamiento.id)
+                .filter(Reserva.id.in_(lote), Reserva.deleted_at.is_(None))
+            )
+            reservas.update((r.id, r) for r in filas)
+
+    posiciones = []
+    mensajes = []
+    for i, trabajo in enumerate(trabajos):
+        reserva = reservas.get(UUID(trabajo["reserva_id"]))
+        # Deleted, archived or moved since it was queued; a move queued its own reminder
+        if reserva is None or reserva.fecha.isoformat() != trabajo["fecha"]:
+            continue
+        posiciones.append(i)
+        mensajes.append({"telefono": reserva.telefono, "email": reserva.email, "texto": texto(reserva)})
+    if not mensajes:
+        return
+
+    rechazados = await transport.send_batch(mensajes)
+    if rechazados:
+        raise jobs.BatchError({posiciones[i]: error for i, error in rechazados.items()})
@@ -0,0 +1,119 @@
+import asyncio
+import logging
+import os
+from collections import defaultdict
+from decimal import Decimal
+
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from bulk import IN_CHUNK_SIZE, chunked
+from database import AsyncWriteSessionLocal
+from intervals import to_minutes
+from models import IngresoDiario, Reserva, ReservaArchivada, Tratamiento, UtilizacionDiaria
+
+logger = logging.getLogger(__name__)
+
+REFRESH_SECONDS = int(os.getenv("REPORT_REFRESH_SECONDS", "0"))
+# PostgreSQL advisory lock class; the second key is 0 for the whole
+# reports or a day's ordinal
+PG_LOCK_ID = 7_304_113
+
+async def _lock(db: AsyncSession, fechas=None):
+    """Serializes report rewrites until the caller commits: of ``fechas``,
+    or of everything when None.
+
+    Otherwise two bookings on one day for different professionals replace
+    the day's rows concurrently on PostgreSQL, and the second one fails on
+    the primary key or writes totals without the first. SQLite already
+    has a single writer."""
+    if db.bind.dialect.name != "postgresql":
+        return
+    if fechas is None:
+        await db.execute(select(func.pg_advisory_xact_lock(PG_LOCK_ID, 0)))
+        return
+    await db.execute(select(func.pg_advisory_xact_lock_shared(PG_LOCK_ID, 0)))
+    # Always in the same order, so two writers cannot deadlock
+    for fecha in sorted(fechas):
+        await db.execute(select(func.pg_advisory_xact_lock(PG_LOCK_ID, fecha.toordinal())))
+
+async def _aggregate(db: AsyncSession, fechas=None, tratamiento_id=None):
+    utilizacion = defaultdict(lambda: [0, 0])
+    ingresos = defaultdict(lambda: [Decimal(0), 0])
+    # Archived days keep counting; soft-deleted reservas do not
+    for modelo in (Reserva, ReservaArchivada):
+        criteria = [modelo.deleted_at.is_(None)]
+        if fechas is not None:
+            criteria.append(modelo.fecha.in_(fechas))
+        if tratamiento_id is not None:
+            criteria.append(modelo.tratamiento_id == tratamiento_id)
+        result = await db.stream(
+            select(modelo.fecha, modelo.profesional_id, modelo.tratamiento_id, modelo.pago,
+                   modelo.hora_inicio, modelo.hora_fin, Tratamiento.precio)
+            .join(Tratamiento, modelo.tratamiento_id == Tratamiento.id)
+            .filter(*criteria)
+            .execution_options(yield_per=5000)
+        )
+        async for r in result:
+            u = utilizacion[(r.fecha, r.profesional_id)]
+            u[0] += to_minutes(r.hora_fin) - to_minutes(r.hora_inicio)
+            u[1] += 1
+            i = ingresos[(r.fecha, r.tratamiento_id, r.pago)]
+            i[0] += r.precio
+            i[1] += 1
+    return utilizacion, ingresos
+
+async def _insert_utilizacion(db: AsyncSession, utilizacion):
+    rows = [
+        {"fecha": fecha, "profesional_id": profesional_id, "minutos_reservados": minutos, "reservas": n}
+        for (fecha, profesional_id), (minutos, n) in utilizacion.items()
+    ]
+    if rows:
+        await db.execute(insert(UtilizacionDiaria), rows)
+
+async def _insert_ingresos(db: AsyncSession, ingresos):
+    rows = [
+        {"fecha": fecha, "tratamiento_id": tratamiento_id, "pago": pago, "ingreso": ingreso, "reservas": n}
+        for (fecha, tratamiento_id, pago), (ingreso, n) in ingresos.items()
+    ]
+    if rows:
+        await db.execute(insert(IngresoDiario), rows)
+
+async def refresh_dias(db: AsyncSession, fechas):
+    """Recomputes both reports for the given days from the day's reservas.
+
+    Runs inside the caller's transaction; the caller commits."""
+    fechas = set(fechas)
+    await _lock(db, fechas)
+    for chunk in chunked(fechas, IN_CHUNK_SIZE):
+        utilizacion, ingresos = await _aggregate(db, fechas=chunk)
+        await db.execute(delete(UtilizacionDiaria).filter(UtilizacionDiaria.fecha.in_(chunk)))
+        await db.execute(delete(IngresoDiario).filter(IngresoDiario.fecha.in_(chunk)))
+        await _insert_utilizacion(db, utilizacion)
+        await _insert_ingresos(db, ingresos)
+
+async def refresh_tratamiento(db: AsyncSession, tratamiento_id):
+    """Recomputes revenue rows of one treatment, e.g. after a price change."""
+    await _lock(db)
+    _, ingresos = await _aggregate(db, tratamiento_id=tratamiento_id)
+    await db.execute(delete(IngresoDiario).filter(IngresoDiario.tratamiento_id == tratamiento_id))
+    await _insert_ingresos(db, ingresos)
+
+async def rebuild_all(db: AsyncSession):
+    await _lock(db)
+    utilizacion, ingresos = await _aggregate(db)
+    await db.execute(delete(UtilizacionDiaria))
+    await db.execute(delete(IngresoDiario))
+    await _insert_utilizacion(db, utilizacion)
+    await _insert_ingresos(db, ingresos)
+
+async def run_refresher(interval: int):
+    # Safety net for writes that bypass the routers (scripts, cascades)
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            async with AsyncWriteSessionLocal() as db:
+                await rebuild_all(db)
+                await db.commit()
+        except Exception:
+            logger.exception("Report refresh failed")
@@ -1,40 +1,50 @@
+import hashlib
+import os
 from datetime import datetime, timedelta, timezone
 from fastapi import APIRouter, Depends, HTTPException
 from fastapi.security import OAuth2PasswordRequestForm, OAuth2PasswordBearer
-from passlib.context import CryptContext
-from sqlalchemy.orm import Session
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Annotated
 from jose.exceptions import JWTError
 from jose import jwt
 from starlette import status
 from pydantic import BaseModel
 
-from database import SessionLocal
+from cache import TTLCache
+from database import AsyncWriteSessionLocal, get_db, get_write_db
 from models import User
+from passwords import hash_password, verify_password
 
 router = APIRouter(prefix="/auth", tags=["auth"])
 
 SECRET_KEY = "AL NAX0 L3 GUSTA 3L P1C0"
 ALGORITHM = "HS256"
 
-bcrypt_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_bearer = OAuth2PasswordBearer(tokenUrl="auth/token")
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+# Decoded claims keyed on the token digest, kept until the token's exp
+token_cache = TTLCache(maxsize=int(os.getenv("TOKEN_CACHE_SIZE", "4096")))
+# User rows as plain dicts keyed on user id; invalidated when the hash changes
+user_cache = TTLCache(maxsize=int(os.getenv("USER_CACHE_SIZE", "1024")), ttl=int(os.getenv("USER_CACHE_TTL", "300")))
 
-db_dependency = Annotated[Session, Depends(get_db)]
+db_dependency = Annotated[AsyncSession, Depends(get_db)]
+write_db_dependency = Annotated[AsyncSession, Depends(get_write_db)]
 
-def authenticate_user(email: str, password: str, db):
-    user = db.query(User).filter(User.email == email).first()
+async def authenticate_user(email: str, password: str, db: AsyncSession):
+    user = await db.scalar(select(User).filter(User.email == email))
     if not user:
         return False
-    if not bcrypt_context.verify(password, user.hashed_password):
+    valid, new_hash = await verify_password(password, user.hashed_password)
+    if not valid:
         return False
+    if new_hash is not None:
+        # Written on its own so the login's read and bcrypt check never hold
+        # the write connection
+        async with AsyncWriteSessionLocal() as write_db:
+            await write_db.execute(update(User).filter(User.id == user.id).values(hashed_password=new_hash))
+            await write_db.commit()
+        user_cache.delete(str(user.id))
     return user
 
 def create_access_token(user_email: str, user_id: int, role: str, expires_delta: timedelta):
@@ -43,7 +53,11 @@ def create_access_token(user_email: str, user_id: int, role: str, expires_delta:
     encode.update({"exp": expires})
     return jwt.encode(encode, SECRET_KEY, algorithm=ALGORITHM)
 
-async def get_current_user(token: Annotated[str, Depends(oauth2_bearer)]):
+def decode_token(token: str):
+    token_key = hashlib.sha256(token.encode()).hexdigest()
+    current_user = token_cache.get(token_key)
+    if current_user is not None:
+        return current_user
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         user_email: str = payload.get("sub")
@@ -51,10 +65,15 @@ async def get_current_user(token: Annotated[str, Depends(oauth2_bearer)]):
         user_role: str = payload.get("role")
         if user_email is None or user_id is None:
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Could not validate user")
-        return {"email": user_email, "id": user_id, "role": user_role}
+        current_user = {"email": user_email, "id": user_id, "role": user_role}
+        token_cache.set(token_key, current_user, expires_at=payload["exp"])
+        return current_user
     except JWTError:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Could not validate user")
 
+async def get_current_user(token: Annotated[str, Depends(oauth2_bearer)]):
+    return decode_token(token)
+
 class CreateUserRequest(BaseModel):
     email :str
     password: str
@@ -64,19 +83,28 @@ class Token(BaseModel):
     access_token: str
     token_type: str
 
+class CacheStats(BaseModel):
+    hits: int
+    misses: int
+    size: int
+
 @router.post("/", status_code=status.HTTP_201_CREATED)
-async def create_user(db: db_dependency, create_user_request: CreateUserRequest):
+async def create_user(db: write_db_dependency, create_user_request: CreateUserRequest):
     create_user_model = User(
     email = create_user_request.email,
-    hashed_password = bcrypt_context.hash(create_user_request.password),
+    hashed_password = await hash_password(create_user_request.password),
     role = create_user_request.role)
     db.add(create_user_model)
-    db.commit()
+    await db.commit()
 
 @router.post("/token", response_model=Token)
 async def login_for_access_token(form_data: Annotated[OAuth2PasswordRequestForm, Depends()], db:db_dependency):
-    user = authenticate_user(form_data.username, form_data.password, db)
+    user = await authenticate_user(form_data.username, form_data.password, db)
     if not user:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Could not validate user")
     token = create_access_token(user.email, user.id, user.role, timedelta(minutes=1440))
-    return {"access_token": token, "token_type": "bearer"}
\ No newline at end of file
+    return {"access_token": token, "token_type": "bearer"}
+
+@router.get("/cache-stats", status_code=status.HTTP_200_OK, response_model=dict[str, CacheStats])
+async def get_cache_stats(user: Annotated[dict, Depends(get_current_user)]):
+    return {"token_cache": token_cache.stats(), "user_cache": user_cache.stats()}
\ No newline at end of file
@@ -1,24 +1,25 @@
-from datetime import date
+import uuid
+from datetime import date, datetime
 from typing import Annotated, Optional
-from fastapi import APIRouter, Depends, HTTPException
-from pydantic import BaseModel, EmailStr
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, Response
+from pydantic import BaseModel, ConfigDict, EmailStr
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from starlette import status
 from uuid import UUID
 
-from database import SessionLocal
+from archivo import borrar_archivadas
+from bulk import IN_CHUNK_SIZE, BulkReport, chunked, read_rows, report, row_error, upsert
+from concurrency import check_if_match, etag, flush
+from database import get_db, get_write_db
 from routers.auth import get_current_user
-from models import Paciente
+from models import Paciente, Reserva, ReservaArchivada
+from reporting import refresh_dias
+from search import MIN_TERM_LENGTH, search_pacientes
+from streaming import stream_query
 
 router = APIRouter(prefix="/pacientes", tags=["Pacientes"])
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
 class PacienteRequest(BaseModel):
     nombre: str
     apellido: str
@@ -26,55 +27,135 @@ class PacienteRequest(BaseModel):
     telefono: str
     fecha_nacimiento: Optional[date]
 
-db_dependency = Annotated[Session, Depends(get_db)]
+class PacienteBulkRequest(PacienteRequest):
+    id: Optional[UUID] = None
+
+class PacienteResponse(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: UUID
+    nombre: str
+    apellido: str
+    email: Optional[str]
+    telefono: str
+    fecha_nacimiento: Optional[date]
+    created_at: Optional[datetime]
+    version: int
+
+db_dependency = Annotated[AsyncSession, Depends(get_db)]
+write_db_dependency = Annotated[AsyncSession, Depends(get_write_db)]
 user_dependency = Annotated[dict, Depends(get_current_user)]
 
-@router.get("/", status_code=status.HTTP_200_OK)
+@router.get("/", status_code=status.HTTP_200_OK, response_model=list[PacienteResponse])
 async def get_pacientes(user: user_dependency, db: db_dependency):
     if user is None:
         raise HTTPException(status_code=401, detail="Authentication Failed")
-    return db.query(Paciente).all()
+    return (await db.scalars(select(Paciente))).all()
+
+@router.get("/export", status_code=status.HTTP_200_OK)
+async def export_pacientes(user: user_dependency, formato: str = Query("ndjson", pattern="^(ndjson|csv)$")):
+    if user is None:
+        raise HTTPException(status_code=401, detail="Authentication Failed")
+
+    statement = select(
+        Paciente.id,
+        Paciente.nombre,
+        Paciente.apellido,
+        Paciente.email,
+        Paciente.telefono,
+        Paciente.fecha_nacimiento,
+        Paciente.created_at
+    ).order_by(Paciente.apellido, Paciente.nombre)
+    return stream_query(statement, formato, "pacientes")
 
-@router.get("/{paciente_id}", status_code=status.HTTP_200_OK)
-async def get_paciente(user: user_dependency, db: db_dependency, paciente_id: str):
+@router.get("/search", status_code=status.HTTP_200_OK, response_model=list[PacienteResponse])
+async def search(user: user_dependency, db: db_dependency, q: str = Query(min_length=MIN_TERM_LENGTH), limit: int = Query(20, ge=1, le=100)):
     if user is None:
         raise HTTPException(status_code=401, detail="Authentication Failed")
-    paciente_model = db.query(Paciente).filter(Paciente.id == UUID(paciente_id)).first()
+    return await search_pacientes(db, q, limit)
+
+@router.get("/{paciente_id}", status_code=status.HTTP_200_OK, response_model=PacienteResponse)
+async def get_paciente(user: user_dependency, db: db_dependency, response: Response, paciente_id: str):
+    if user is None:
+        raise HTTPException(status_code=401, detail="Authentication Failed")
+    paciente_model = await db.get(Paciente, UUID(paciente_id))
     if paciente_model is None:
         raise HTTPException(status_code=404, detail="Paciente not found")
+    response.headers["ETag"] = etag(paciente_model)
     return paciente_model
 
-@router.post("/", status_code=status.HTTP_201_CREATED)
-async def create_paciente(user: user_dependency, db: db_dependency, paciente_request: PacienteRequest):
+@router.post("/bulk", status_code=status.HTTP_200_OK, response_model=BulkReport)
+async def bulk_upsert_pacientes(request: Request, user: user_dependency, db: write_db_dependency):
+    if user is None:
+        raise HTTPException(status_code=401, detail="Authentication Failed")
+    total, items, errors = await read_rows(request, PacienteBulkRequest)
+
+    emails = {item.email for _, item in items if item.email}
+    email_owners = {}
+    for chunk in chunked(emails, IN_CHUNK_SIZE):
+        for paciente_id, email in await db.execute(select(Paciente.id, Paciente.email).filter(Paciente.email.in_(chunk))):
+            email_owners[email] = paciente_id
+
+    rows = []
+    seen_emails = set()
+    for i, item in items:
+        paciente_id = item.id or uuid.uuid4()
+        if item.email:
+            if item.email in seen_emails:
+                errors.append(row_error(i, "Duplicate email in request"))
+                continue
+            if email_owners.get(item.email, paciente_id) != paciente_id:
+                errors.append(row_error(i, "Email already registered"))
+                continue
+            seen_emails.add(item.email)
+        rows.append((i, {"id": paciente_id, **item.model_dump(exclude={"id"})}))
+
+    written, write_errors = await upsert(db, Paciente, rows, ["nombre", "apellido", "email", "telefono", "fecha_nacimiento"])
+    return report(total, written, errors + write_errors)
+
+@router.post("/", status_code=status.HTTP_201_CREATED, response_model=PacienteResponse)
+async def create_paciente(user: user_dependency, db: write_db_dependency, response: Response, paciente_request: PacienteRequest):
     if user is None:
         raise HTTPException(status_code=401, detail="Authentication Failed")
     paciente_model = Paciente(**paciente_request.model_dump())
 
     db.add(paciente_model)
-    db.commit()
+    await db.commit()
+    response.headers["ETag"] = etag(paciente_model)
+    return paciente_model
 
 @router.put("/{paciente_id}", status_code=status.HTTP_204_NO_CONTENT)
-async def update_paciente(user: user_dependency, db: db_dependency, paciente_request: PacienteRequest, paciente_id: str):
+async def update_paciente(user: user_dependency, db: write_db_dependency, response: Response, paciente_request: PacienteRequest, paciente_id: str,
+                          if_match: Annotated[Optional[str], Header()] = None):
     if user is None:
         raise HTTPException(status_code=401, detail="Authentication Failed")
-    paciente_model = db.query(Paciente).filter(Paciente.id == UUID(paciente_id)).first()
+    paciente_model = await db.get(Paciente, UUID(paciente_id))
     if paciente_model is None:
         raise HTTPException(status_code=404, detail="Paciente not found")
+    check_if_match(if_match, paciente_model)
     paciente_model.nombre = paciente_request.nombre
     paciente_model.apellido = paciente_request.apellido
     paciente_model.email = paciente_request.email
     paciente_model.fecha_nacimiento = paciente_request.fecha_nacimiento
 
     db.add(paciente_model)
-    db.commit()
+    await flush(db)
+    await db.commit()
+    response.headers["ETag"] = etag(paciente_model)
 
 @router.delete("/paciente/{paciente_id}", status_code=status.HTTP_204_NO_CONTENT)
-async def delete_paciente(user: user_dependency, db: db_dependency, paciente_id: str):
+async def delete_paciente(user: user_dependency, db: write_db_dependency, paciente_id: str):
     if user is None:
         raise HTTPException(status_code=401, detail="Authentication Failed")
-    paciente_model = db.query(Paciente).filter(Paciente.id == UUID(paciente_id)).first()
+    paciente_model = await db.get(Paciente, UUID(paciente_id))
     if paciente_model is None:
         raise HTTPException(status_code=404, detail="Paciente not Found")
-    
-    db.query(Paciente).filter(Paciente.id == UUID(paciente_id)).delete()
-    db.commit()
\ No newline at end of file
+
+    # The database cascades the delete to its reservas and archived ones are
+    # removed here; their days' reports are refreshed in the same transaction
+    fechas = set((await db.scalars(select(Reserva.fecha).filter(Reserva.paciente_id == paciente_model.id).distinct())).all())
+    fechas.update(await borrar_archivadas(db, ReservaArchivada.paciente_id == paciente_model.id))
+    await db.delete(paciente_model)
+    await flush(db)
+    await refresh_dias(db, fechas)
+    await db.commit()
\ No newline at end of file
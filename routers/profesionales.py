@@ -1,74 +1,95 @@
-from datetime import date
+from datetime import date, datetime
 from typing import Annotated, Optional
-from fastapi import APIRouter, Depends, HTTPException
-from pydantic import BaseModel, EmailStr
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Request
+from pydantic import BaseModel, ConfigDict, EmailStr
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from starlette import status
 from uuid import UUID
 
-from database import SessionLocal
+from archivo import borrar_archivadas
+from cache import ResponseCache
+from database import get_db, get_write_db
 from routers.auth import get_current_user
-from models import Profesional
+from models import Profesional, Reserva, ReservaArchivada
+from reporting import refresh_dias
 
 router = APIRouter(prefix="/profesionales", tags=["Profesionales"])
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
 class ProfesionalRequest(BaseModel):
     nombre_completo: str
     tipo: str
 
-db_dependency = Annotated[Session, Depends(get_db)]
+class ProfesionalResponse(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: UUID
+    nombre_completo: str
+    tipo: str
+    created_at: Optional[datetime]
+
+db_dependency = Annotated[AsyncSession, Depends(get_db)]
+write_db_dependency = Annotated[AsyncSession, Depends(get_write_db)]
 user_dependency = Annotated[dict, Depends(get_current_user)]
 
-@router.get("/", status_code=status.HTTP_200_OK)
-async def get_profesionales(user: user_dependency, db: db_dependency):
+profesionales_cache = ResponseCache("profesionales", list[ProfesionalResponse])
+
+@router.get("/", status_code=status.HTTP_200_OK, response_model=list[ProfesionalResponse])
+async def get_profesionales(request: Request, user: user_dependency, db: db_dependency):
     if user is None:
         raise HTTPException(status_code=401, detail="Authentication Failed")
-    return db.query(Profesional).all()
 
-@router.get("/{profesional_id}", status_code=status.HTTP_200_OK)
+    async def load():
+        return (await db.scalars(select(Profesional))).all()
+
+    return await profesionales_cache.respond(request, load)
+
+@router.get("/{profesional_id}", status_code=status.HTTP_200_OK, response_model=ProfesionalResponse)
 async def get_profesional(user: user_dependency, db: db_dependency, profesional_id: str):
     if user is None:
         raise HTTPException(status_code=401, detail="Authentication Failed")
-    profesional_model = db.query(Profesional).filter(Profesional.id == UUID(profesional_id)).first()
+    profesional_model = await db.get(Profesional, UUID(profesional_id))
     if profesional_model is None:
         raise HTTPException(status_code=404, detail="Profesional not found")
     return profesional_model
 
 @router.post("/", status_code=status.HTTP_201_CREATED)
-async def create_profesional(user: user_dependency, db: db_dependency, profesional_request: ProfesionalRequest):
+async def create_profesional(user: user_dependency, db: write_db_dependency, profesional_request: ProfesionalRequest):
     if user is None:
         raise HTTPException(status_code=401, detail="Authentication Failed")
     profesional_model = Profesional(**profesional_request.model_dump())
     db.add(profesional_model)
-    db.commit()
+    await db.commit()
+    await profesionales_cache.invalidate()
 
 @router.put("/{profesional_id}", status_code=status.HTTP_204_NO_CONTENT)
-async def update_profesional(user: user_dependency, db: db_dependency, profesional_request: ProfesionalRequest, profesional_id: str):
+async def update_profesional(user: user_dependency, db: write_db_dependency, profesional_request: ProfesionalRequest, profesional_id: str):
     if user is None:
         raise HTTPException(status_code=401, detail="Authentication Failed")
-    profesional_model = db.query(Profesional).filter(Profesional.id == UUID(profesional_id)).first()
+    profesional_model = await db.get(Profesional, UUID(profesional_id))
     if profesional_model is None:
         raise HTTPException(status_code=404, detail="Profesional not found")
     profesional_model.nombre_completo = profesional_request.nombre_completo
     profesional_model.tipo = profesional_request.tipo
 
     db.add(profesional_model)
-    db.commit()
+    await db.commit()
+    await profesionales_cache.invalidate()
 
 @router.delete("/{profesional_id}", status_code=status.HTTP_204_NO_CONTENT)
-async def delete_profesional(user: user_dependency, db: db_dependency, profesional_id: str):
+async def delete_profesional(user: user_dependency, db: write_db_dependency, profesional_id: str):
     if user is None:
         raise HTTPException(status_code=401, detail="Authentication Failed")
-    profesional_model = db.query(Profesional).filter(Profesional.id == UUID(profesional_id)).first()
+    profesional_model = await db.get(Profesional, UUID(profesional_id))
     if profesional_model is None:
         raise HTTPException(status_code=404, detail="Profesional not Found")
-    
-    db.query(Profesional).filter(Profesional.id == UUID(profesional_id)).delete()
-    db.commit()
\ No newline at end of file
+
+    # The database cascades the delete to its reservas and archived ones are
+    # removed here; their days' reports are refreshed in the same transaction
+    fechas = set((await db.scalars(select(Reserva.fecha).filter(Reserva.profesional_id == profesional_model.id).distinct())).all())
+    fechas.update(await borrar_archivadas(db, ReservaArchivada.profesional_id == profesional_model.id))
+    await db.delete(profesional_model)
+    await db.flush()
+    await refresh_dias(db, fechas)
+    await db.commit()
+    await profesionales_cache.invalidate()
\ No newline at end of file
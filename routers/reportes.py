@@ -0,0 +1,94 @@
+from datetime import date
+from typing import Annotated, Optional
+from fastapi import APIRouter, Depends, HTTPException
+from pydantic import BaseModel, ConfigDict
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette import status
+from uuid import UUID
+
+from database import get_db, get_write_db
+from intervals import to_minutes
+from models import IngresoDiario, Profesional, Tratamiento, UtilizacionDiaria
+from reporting import rebuild_all
+from routers.auth import get_current_user
+from routers.reservas import HORA_APERTURA, HORA_CIERRE
+
+router = APIRouter(prefix="/reportes", tags=["Reportes"])
+
+db_dependency = Annotated[AsyncSession, Depends(get_db)]
+write_db_dependency = Annotated[AsyncSession, Depends(get_write_db)]
+user_dependency = Annotated[dict, Depends(get_current_user)]
+
+JORNADA_MINUTOS = to_minutes(HORA_CIERRE) - to_minutes(HORA_APERTURA)
+
+class IngresoResponse(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    fecha: date
+    tratamiento_id: UUID
+    tratamiento_nombre: str
+    pago: str
+    ingreso: float
+    reservas: int
+
+class UtilizacionResponse(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    fecha: date
+    profesional_id: UUID
+    profesional_nombre_completo: str
+    minutos_reservados: int
+    reservas: int
+    utilizacion: float
+
+@router.get("/ingresos", status_code=status.HTTP_200_OK, response_model=list[IngresoResponse])
+async def get_ingresos(user: user_dependency, db: db_dependency, fecha_desde: date, fecha_hasta: date, tratamiento_id: Optional[UUID] = None):
+    if user is None:
+        raise HTTPException(status_code=401, detail="Authentication Failed")
+    query = (
+        select(
+            IngresoDiario.fecha,
+            IngresoDiario.tratamiento_id,
+            Tratamiento.nombre.label("tratamiento_nombre"),
+            IngresoDiario.pago,
+            IngresoDiario.ingreso,
+            IngresoDiario.reservas
+        )
+        .join(Tratamiento, IngresoDiario.tratamiento_id == Tratamiento.id)
+        .filter(IngresoDiario.fecha >= fecha_desde, IngresoDiario.fecha <= fecha_hasta)
+        .order_by(IngresoDiario.fecha, Tratamiento.nombre, IngresoDiario.pago)
+    )
+    if tratamiento_id is not None:
+        query = query.filter(IngresoDiario.tratamiento_id == tratamiento_id)
+    return [IngresoResponse.model_validate(r) for r in await db.execute(query)]
+
+@router.get("/utilizacion", status_code=status.HTTP_200_OK, response_model=list[UtilizacionResponse])
+async def get_utilizacion(user: user_dependency, db: db_dependency, fecha_desde: date, fecha_hasta: date, profesional_id: Optional[UUID] = None):
+    if user is None:
+        raise HTTPException(status_code=401, detail="Authentication Failed")
+    query = (
+        select(
+            UtilizacionDiaria.fecha,
+            UtilizacionDiaria.profesional_id,
+            Profesional.nombre_completo.label("profesional_nombre_completo"),
+            UtilizacionDiaria.minutos_reservados,
+            UtilizacionDiaria.reservas
+        )
+        .join(Profesional, UtilizacionDiaria.profesional_id == Profesional.id)
+        .filter(UtilizacionDiaria.fecha >= fecha_desde, UtilizacionDiaria.fecha <= fecha_hasta)
+        .order_by(UtilizacionDiaria.fecha, Profesional.nombre_completo)
+    )
+    if profesional_id is not None:
+        query = query.filter(UtilizacionDiaria.profesional_id == profesional_id)
+    return [
+        UtilizacionResponse(**r._mapping, utilizacion=round(r.minutos_reservados / JORNADA_MINUTOS, 4))
+        for r in await db.execute(query)
+    ]
+
+@router.post("/refresh", status_code=status.HTTP_204_NO_CONTENT)
+async def refresh_reportes(user: user_dependency, db: write_db_dependency):
+    if user is None:
+        raise HTTPException(status_code=401, detail="Authentication Failed")
+    await rebuild_all(db)
+    await db.commit()
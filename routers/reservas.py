@@ -1,23 +1,35 @@
-from datetime import date, time
-from typing import Annotated, Optional
-from fastapi import APIRouter, Depends, HTTPException
-from pydantic import BaseModel, EmailStr
-from sqlalchemy.orm import Session
+import asyncio
+import base64
+import uuid
+from datetime import date, datetime, time, timedelta, timezone
+from itertools import groupby
+from typing import Annotated, Literal, Optional
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, Response, WebSocket
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, ConfigDict, EmailStr
+from sqlalchemy import delete, literal, select, tuple_, union_all
+from sqlalchemy.ext.asyncio import AsyncSession
 from starlette import status
 from uuid import UUID
 
-from database import SessionLocal
-from routers.auth import get_current_user
-from models import Reserva, Paciente, Profesional, Tratamiento
+from bulk import IN_CHUNK_SIZE, BulkReport, chunked, existing_values, read_rows, report, row_error, upsert
+from concurrency import check_if_match, etag, flush
+from database import get_db, get_write_db
+from events import broker, canal_fecha, canal_profesional
+from routers.auth import decode_token, get_current_user
+from models import Reserva, ReservaArchivada, Paciente, Profesional, Tratamiento
+from recordatorios import programar_recordatorios
+from streaming import stream_query
+from intervals import IntervalIndex, to_minutes, to_time
+from reporting import refresh_dias
 
 router = APIRouter(prefix="/reservas", tags=["Reservas"])
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+HORA_APERTURA = time(9, 0)
+HORA_CIERRE = time(19, 0)
+INTERVALO_MINUTOS = 15
+MAX_DIAS_DISPONIBILIDAD = 31
+KEEPALIVE_SEGUNDOS = 15
 
 class ReservaRequest(BaseModel):
     paciente_id: str
@@ -26,21 +38,189 @@ class ReservaRequest(BaseModel):
     fecha: date
     hora_inicio: time
     hora_fin: time
+    atencion: Literal["agendada", "confirmada", "espera", "atendida"]
+    pago: Literal["listo", "pendiente"]
+
+class ReservaBulkRequest(ReservaRequest):
+    id: Optional[UUID] = None
+
+class ReservaEstado(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: UUID
+    fecha: date
+    hora_inicio: time
+    hora_fin: time
+    atencion: str
+    pago: str
+    paciente_id: UUID
+    profesional_id: UUID
+    tratamiento_id: UUID
+    version: int
+
+class ReservaResponse(ReservaEstado):
+    created_at: Optional[datetime]
+
+class ReservaDetalle(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: UUID
+    paciente_id: UUID
+    paciente_nombre: str
+    paciente_apellido: str
+    profesional_id: UUID
+    profesional_nombre_completo: str
+    tratamiento_id: UUID
+    tratamiento_nombre: str
+    tratamiento_duracion_minutos: int
+    fecha: date
+    hora_inicio: time
+    hora_fin: time
+    atencion: str
+    pago: str
+
+class SlotDisponible(BaseModel):
+    profesional_id: UUID
+    fecha: date
+    hora_inicio: time
+    hora_fin: time
+
+class AgendaReserva(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: UUID
+    hora_inicio: time
+    hora_fin: time
     atencion: str
     pago: str
+    paciente_id: UUID
+    paciente_nombre: str
+    paciente_apellido: str
+    paciente_telefono: str
+    tratamiento_id: UUID
+    tratamiento_nombre: str
+    tratamiento_duracion_minutos: int
 
-db_dependency = Annotated[Session, Depends(get_db)]
+class AgendaProfesional(BaseModel):
+    profesional_id: UUID
+    profesional_nombre_completo: str
+    reservas: list[AgendaReserva]
+
+db_dependency = Annotated[AsyncSession, Depends(get_db)]
+write_db_dependency = Annotated[AsyncSession, Depends(get_write_db)]
 user_dependency = Annotated[dict, Depends(get_current_user)]
 
-@router.get("/", status_code=status.HTTP_200_OK)
-async def get_all(user: dict = Depends(get_current_user), db: Session = Depends(get_db)):
-    if user is None:
-        raise HTTPException(status_code=401, detail="Authentication Failed")
+def encode_cursor(fecha: date, hora_inicio: time, reserva_id: UUID) -> str:
+    raw = f"{fecha.isoformat()}|{hora_inicio.isoformat()}|{reserva_id.hex}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
 
-    # Perform explicit joins without modifying the models
-    query = (
-        db.query(
-            Reserva.id,
+def decode_cursor(cursor: str):
+    try:
+        fecha, hora_inicio, reserva_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return date.fromisoformat(fecha), time.fromisoformat(hora_inicio), UUID(reserva_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+async def check_disponible(db: AsyncSession, profesional_id: UUID, fecha: date, hora_inicio: time, hora_fin: time, reserva_id: Optional[UUID] = None):
+    if hora_fin <= hora_inicio:
+        raise HTTPException(status_code=400, detail="hora_fin must be after hora_inicio")
+    # Lock the professional's row so concurrent bookings for the same professional
+    # are serialized until commit (SQLite already serializes writers)
+    profesional_model = await db.scalar(select(Profesional.id).filter(Profesional.id == profesional_id).with_for_update())
+    if profesional_model is None:
+        raise HTTPException(status_code=404, detail="Profesional not found")
+    # Range query on the (profesional_id, fecha) index
+    query = select(Reserva.id).filter(
+        Reserva.profesional_id == profesional_id,
+        Reserva.fecha == fecha,
+        Reserva.hora_inicio < hora_fin,
+        Reserva.hora_fin > hora_inicio,
+        Reserva.deleted_at.is_(None)
+    )
+    if reserva_id is not None:
+        query = query.filter(Reserva.id != reserva_id)
+    if await db.scalar(query.limit(1)) is not None:
+        raise HTTPException(status_code=409, detail="Reserva overlaps an existing reserva")
+
+async def check_referencias(db: AsyncSession, paciente_id: UUID, tratamiento_id: UUID):
+    # Otherwise the foreign keys reject them at flush, as a 500
+    if await db.scalar(select(Paciente.id).filter(Paciente.id == paciente_id)) is None:
+        raise HTTPException(status_code=404, detail="Paciente not found")
+    if await db.scalar(select(Tratamiento.id).filter(Tratamiento.id == tratamiento_id)) is None:
+        raise HTTPException(status_code=404, detail="Tratamiento not found")
+
+async def check_disponibles(db: AsyncSession, rows):
+    """check_disponible for a bulk chunk: locks its professionals and
+    returns ``(rows, errors)`` with the overlapping rows moved to errors."""
+    ids = {v["id"] for _, v in rows}
+    desde = min(v["fecha"] for _, v in rows)
+    hasta = max(v["fecha"] for _, v in rows)
+    # Existing bookings minus the rows about to be overwritten; professionals
+    # are locked in a fixed order so two imports cannot deadlock
+    ocupadas = IntervalIndex()
+    for lote in chunked(sorted({v["profesional_id"] for _, v in rows}), IN_CHUNK_SIZE):
+        await db.execute(select(Profesional.id).filter(Profesional.id.in_(lote)).order_by(Profesional.id).with_for_update())
+        existentes = await db.execute(
+            select(Reserva.id, Reserva.profesional_id, Reserva.fecha, Reserva.hora_inicio, Reserva.hora_fin)
+            .filter(Reserva.profesional_id.in_(lote), Reserva.fecha >= desde, Reserva.fecha <= hasta, Reserva.deleted_at.is_(None))
+        )
+        for r in existentes:
+            if r.id not in ids:
+                ocupadas.add((r.profesional_id, r.fecha), to_minutes(r.hora_inicio), to_minutes(r.hora_fin))
+
+    disponibles = []
+    solapadas = []
+    for i, values in rows:
+        key = (values["profesional_id"], values["fecha"])
+        inicio, fin = to_minutes(values["hora_inicio"]), to_minutes(values["hora_fin"])
+        if ocupadas.overlaps(key, inicio, fin):
+            solapadas.append(row_error(i, "Reserva overlaps an existing reserva"))
+            continue
+        ocupadas.add(key, inicio, fin)
+        disponibles.append((i, values))
+    return disponibles, solapadas
+
+async def check_importacion(db: AsyncSession, rows):
+    """Bulk chunk check: check_disponibles, then drops the archived copies
+    of the rows it keeps. Importing an archived id restores it to reservas,
+    like a soft-deleted one, instead of adding a second live copy."""
+    rows, errors = await check_disponibles(db, rows)
+    for lote in chunked([v["id"] for _, v in rows], IN_CHUNK_SIZE):
+        await db.execute(delete(ReservaArchivada).filter(ReservaArchivada.id.in_(lote)))
+    return rows, errors
+
+def canales(claves):
+    """Day and professional channels for ``(fecha, profesional_id)`` pairs."""
+    result = set()
+    for fecha, profesional_id in claves:
+        result.add(canal_fecha(fecha))
+        result.add(canal_profesional(profesional_id))
+    return sorted(result)
+
+async def publicar(tipo: str, reserva_model: Reserva, claves):
+    # Moved reservas are announced on both their old and new channels
+    await broker.publish(canales(claves), {
+        "tipo": tipo,
+        "reserva_id": reserva_model.id,
+        "fecha": reserva_model.fecha,
+        "profesional_id": reserva_model.profesional_id,
+        "reserva": ReservaEstado.model_validate(reserva_model).model_dump() if tipo != "eliminada" else None
+    })
+
+def canales_suscripcion(fecha: Optional[date], profesional_id: Optional[UUID]):
+    result = []
+    if fecha is not None:
+        result.append(canal_fecha(fecha))
+    if profesional_id is not None:
+        result.append(canal_profesional(profesional_id))
+    return result
+
+def reservas_query(modelo=Reserva):
+    # Perform explicit joins without modifying the models; ``modelo`` is
+    # Reserva or ReservaArchivada, which share their columns
+    return (
+        select(
+            modelo.id,
             Paciente.id.label("paciente_id"),
             Paciente.nombre.label("paciente_nombre"),
             Paciente.apellido.label("paciente_apellido"),
@@ -49,53 +229,325 @@ async def get_all(user: dict = Depends(get_current_user), db: Session = Depends(
             Tratamiento.id.label("tratamiento_id"),
             Tratamiento.nombre.label("tratamiento_nombre"),
             Tratamiento.duracion_minutos.label("tratamiento_duracion_minutos"),
-            Reserva.fecha,
+            modelo.fecha,
+            modelo.hora_inicio,
+            modelo.hora_fin,
+            modelo.atencion,
+            modelo.pago
+        )
+        .join(Paciente, modelo.paciente_id == Paciente.id)
+        .join(Profesional, modelo.profesional_id == Profesional.id)
+        .join(Tratamiento, modelo.tratamiento_id == Tratamiento.id)
+        .filter(modelo.deleted_at.is_(None))
+    )
+
+def con_archivadas(filtrar):
+    """History path: ``filtrar(modelo)`` applied to the hot and archived
+    reservas, combined into one selectable with the same columns."""
+    return union_all(filtrar(Reserva), filtrar(ReservaArchivada)).subquery()
+
+@router.get("/", status_code=status.HTTP_200_OK, response_model=list[ReservaDetalle])
+async def get_all(response: Response,
+                  user: dict = Depends(get_current_user),
+                  db: AsyncSession = Depends(get_db),
+                  fecha_desde: Optional[date] = None,
+                  fecha_hasta: Optional[date] = None,
+                  profesional_id: Optional[UUID] = None,
+                  paciente_id: Optional[UUID] = None,
+                  atencion: Optional[str] = None,
+                  pago: Optional[str] = None,
+                  cursor: Optional[str] = None,
+                  limit: int = Query(100, ge=1, le=500),
+                  include_archived: bool = False):
+    if user is None:
+        raise HTTPException(status_code=401, detail="Authentication Failed")
+
+    def filtrar(modelo):
+        query = reservas_query(modelo)
+        if fecha_desde is not None:
+            query = query.filter(modelo.fecha >= fecha_desde)
+        if fecha_hasta is not None:
+            query = query.filter(modelo.fecha <= fecha_hasta)
+        if profesional_id is not None:
+            query = query.filter(modelo.profesional_id == profesional_id)
+        if paciente_id is not None:
+            query = query.filter(modelo.paciente_id == paciente_id)
+        if atencion is not None:
+            query = query.filter(modelo.atencion == atencion)
+        if pago is not None:
+            query = query.filter(modelo.pago == pago)
+        # Keyset pagination: resume strictly after the last (fecha, hora_inicio, id) seen.
+        # The values take the columns' types; an untyped UUID would bind as
+        # text and never compare equal to the binary ids
+        if cursor is not None:
+            columnas = (modelo.fecha, modelo.hora_inicio, modelo.id)
+            valores = (literal(v, c.type) for v, c in zip(decode_cursor(cursor), columnas))
+            query = query.filter(tuple_(*columnas) > tuple_(*valores))
+        return query
+
+    if include_archived:
+        historial = con_archivadas(filtrar)
+        query = select(historial).order_by(historial.c.fecha, historial.c.hora_inicio, historial.c.id)
+    else:
+        query = filtrar(Reserva).order_by(Reserva.fecha, Reserva.hora_inicio, Reserva.id)
+
+    # Fetch one extra row to know whether there is a next page
+    results = (await db.execute(query.limit(limit + 1))).all()
+    if len(results) > limit:
+        results = results[:limit]
+        last = results[-1]
+        response.headers["X-Next-Cursor"] = encode_cursor(last.fecha, last.hora_inicio, last.id)
+
+    return [ReservaDetalle.model_validate(r) for r in results]
+
+@router.get("/export", status_code=status.HTTP_200_OK)
+async def export_reservas(user: user_dependency,
+                          fecha_desde: Optional[date] = None,
+                          fecha_hasta: Optional[date] = None,
+                          formato: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+                          include_archived: bool = False):
+    if user is None:
+        raise HTTPException(status_code=401, detail="Authentication Failed")
+
+    def filtrar(modelo):
+        query = reservas_query(modelo)
+        if fecha_desde is not None:
+            query = query.filter(modelo.fecha >= fecha_desde)
+        if fecha_hasta is not None:
+            query = query.filter(modelo.fecha <= fecha_hasta)
+        return query
+
+    if include_archived:
+        historial = con_archivadas(filtrar)
+        query = select(historial).order_by(historial.c.fecha, historial.c.hora_inicio, historial.c.id)
+    else:
+        query = filtrar(Reserva).order_by(Reserva.fecha, Reserva.hora_inicio, Reserva.id)
+
+    return stream_query(query, formato, "reservas")
+
+@router.get("/eventos", status_code=status.HTTP_200_OK)
+async def stream_eventos(user: user_dependency, fecha: Optional[date] = None, profesional_id: Optional[UUID] = None):
+    if user is None:
+        raise HTTPException(status_code=401, detail="Authentication Failed")
+    suscripcion = canales_suscripcion(fecha, profesional_id)
+    if not suscripcion:
+        raise HTTPException(status_code=400, detail="fecha or profesional_id is required")
+
+    async def generate():
+        subscription = broker.subscribe(suscripcion)
+        try:
+            while True:
+                try:
+                    message = await asyncio.wait_for(subscription.get(), KEEPALIVE_SEGUNDOS)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                yield f"data: {message}\n\n"
+        finally:
+            subscription.close()
+
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    return StreamingResponse(generate(), media_type="text/event-stream", headers=headers)
+
+@router.websocket("/eventos/ws")
+async def websocket_eventos(websocket: WebSocket,
+                            fecha: Optional[date] = None,
+                            profesional_id: Optional[UUID] = None,
+                            token: Optional[str] = None):
+    # Browsers cannot set headers on a WebSocket, so the token may also come
+    # in the query string
+    token = token or websocket.headers.get("authorization", "").removeprefix("Bearer ").strip()
+    try:
+        user = decode_token(token) if token else None
+    except HTTPException:
+        user = None
+    suscripcion = canales_suscripcion(fecha, profesional_id)
+    if user is None or not suscripcion:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+
+    await websocket.accept()
+    subscription = broker.subscribe(suscripcion)
+    receive = asyncio.ensure_future(websocket.receive())
+    try:
+        while True:
+            get = asyncio.ensure_future(subscription.get())
+            done, _ = await asyncio.wait({receive, get}, return_when=asyncio.FIRST_COMPLETED)
+            if get in done:
+                await websocket.send_text(get.result())
+            else:
+                get.cancel()
+            if receive in done:
+                if receive.result()["type"] == "websocket.disconnect":
+                    break
+                receive = asyncio.ensure_future(websocket.receive())
+    finally:
+        receive.cancel()
+        subscription.close()
+
+@router.get("/agenda", status_code=status.HTTP_200_OK, response_model=list[AgendaProfesional])
+async def get_agenda(user: user_dependency, db: db_dependency, fecha: date):
+    if user is None:
+        raise HTTPException(status_code=401, detail="Authentication Failed")
+    # One join filtered on the fecha index, already in display order
+    query = (
+        select(
+            Reserva.id,
             Reserva.hora_inicio,
             Reserva.hora_fin,
             Reserva.atencion,
-            Reserva.pago
+            Reserva.pago,
+            Reserva.profesional_id,
+            Profesional.nombre_completo.label("profesional_nombre_completo"),
+            Paciente.id.label("paciente_id"),
+            Paciente.nombre.label("paciente_nombre"),
+            Paciente.apellido.label("paciente_apellido"),
+            Paciente.telefono.label("paciente_telefono"),
+            Tratamiento.id.label("tratamiento_id"),
+            Tratamiento.nombre.label("tratamiento_nombre"),
+            Tratamiento.duracion_minutos.label("tratamiento_duracion_minutos")
         )
         .join(Paciente, Reserva.paciente_id == Paciente.id)
         .join(Profesional, Reserva.profesional_id == Profesional.id)
         .join(Tratamiento, Reserva.tratamiento_id == Tratamiento.id)
+        .filter(Reserva.fecha == fecha, Reserva.deleted_at.is_(None))
+        .order_by(Profesional.nombre_completo, Reserva.profesional_id, Reserva.hora_inicio)
     )
-
-    results = query.all()
-
-    # Convert the result tuples into dictionaries for JSON output
-    reservas = [
-        {
-            "id": r.id,
-            "paciente_id": r.paciente_id,
-            "paciente_nombre": r.paciente_nombre,
-            "paciente_apellido": r.paciente_apellido,
-            "profesional_id": r.profesional_id,
-            "profesional_nombre_completo": r.profesional_nombre_completo,
-            "tratamiento_id": r.tratamiento_id,
-            "tratamiento_nombre": r.tratamiento_nombre,
-            "tratamiento_duracion_minutos": r.tratamiento_duracion_minutos,
-            "fecha": r.fecha,
-            "hora_inicio": r.hora_inicio,
-            "hora_fin": r.hora_fin,
-            "atencion": r.atencion,
-            "pago": r.pago
-        }
-        for r in results
+    rows = (await db.execute(query)).all()
+    return [
+        AgendaProfesional(
+            profesional_id=profesional_id,
+            profesional_nombre_completo=grupo[0].profesional_nombre_completo,
+            reservas=[AgendaReserva.model_validate(r) for r in grupo]
+        )
+        for profesional_id, grupo in ((k, list(g)) for k, g in groupby(rows, key=lambda r: r.profesional_id))
     ]
 
-    return reservas
+@router.get("/disponibilidad", status_code=status.HTTP_200_OK, response_model=list[SlotDisponible])
+async def get_disponibilidad(user: user_dependency, db: db_dependency,
+                             tratamiento_id: UUID,
+                             fecha_desde: date,
+                             fecha_hasta: date,
+                             profesional_id: Optional[UUID] = None):
+    if user is None:
+        raise HTTPException(status_code=401, detail="Authentication Failed")
+    if fecha_hasta < fecha_desde or (fecha_hasta - fecha_desde).days >= MAX_DIAS_DISPONIBILIDAD:
+        raise HTTPException(status_code=400, detail="Invalid date range")
+    tratamiento_model = await db.get(Tratamiento, tratamiento_id)
+    if tratamiento_model is None:
+        raise HTTPException(status_code=404, detail="Tratamiento not found")
+
+    profesionales_query = select(Profesional.id)
+    ocupadas_query = (
+        select(Reserva.profesional_id, Reserva.fecha, Reserva.hora_inicio, Reserva.hora_fin)
+        .filter(Reserva.fecha >= fecha_desde, Reserva.fecha <= fecha_hasta, Reserva.deleted_at.is_(None))
+    )
+    if profesional_id is not None:
+        profesionales_query = profesionales_query.filter(Profesional.id == profesional_id)
+        ocupadas_query = ocupadas_query.filter(Reserva.profesional_id == profesional_id)
+    profesional_ids = (await db.scalars(profesionales_query)).all()
+    if profesional_id is not None and not profesional_ids:
+        raise HTTPException(status_code=404, detail="Profesional not found")
 
-@router.get("/{reserva_id}", status_code=status.HTTP_200_OK)
-async def get_reserva(user: user_dependency, db: db_dependency, reserva_id: str):
+    ocupadas = IntervalIndex()
+    for r in await db.execute(ocupadas_query):
+        ocupadas.add((r.profesional_id, r.fecha), to_minutes(r.hora_inicio), to_minutes(r.hora_fin))
+
+    apertura = to_minutes(HORA_APERTURA)
+    cierre = to_minutes(HORA_CIERRE)
+    dias = [fecha_desde + timedelta(days=d) for d in range((fecha_hasta - fecha_desde).days + 1)]
+    return [
+        SlotDisponible(
+            profesional_id=p_id,
+            fecha=fecha,
+            hora_inicio=to_time(inicio),
+            hora_fin=to_time(inicio + tratamiento_model.duracion_minutos)
+        )
+        for p_id in profesional_ids
+        for fecha in dias
+        for inicio in ocupadas.free_slots((p_id, fecha), apertura, cierre, tratamiento_model.duracion_minutos, INTERVALO_MINUTOS)
+    ]
+
+@router.get("/{reserva_id}", status_code=status.HTTP_200_OK, response_model=ReservaResponse)
+async def get_reserva(user: user_dependency, db: db_dependency, response: Response, reserva_id: str, include_archived: bool = False):
     if user is None:
         raise HTTPException(status_code=401, detail="Authentication Failed")
-    reserva_model = db.query(Reserva).filter(Reserva.id == UUID(reserva_id)).first()
-    if reserva_model is not None:
+    reserva_model = await db.get(Reserva, UUID(reserva_id))
+    if reserva_model is None and include_archived:
+        reserva_model = await db.get(ReservaArchivada, UUID(reserva_id))
+    if reserva_model is None or reserva_model.deleted_at is not None:
         raise HTTPException(status_code=404, detail="Reserva not found")
+    response.headers["ETag"] = etag(reserva_model)
     return reserva_model
 
-@router.post("/", status_code=status.HTTP_201_CREATED)
-async def create_reserva(user: user_dependency, db: db_dependency, reserva_request: ReservaRequest):
+@router.post("/bulk", status_code=status.HTTP_200_OK, response_model=BulkReport)
+async def bulk_upsert_reservas(request: Request, user: user_dependency, db: write_db_dependency):
+    if user is None:
+        raise HTTPException(status_code=401, detail="Authentication Failed")
+    total, items, errors = await read_rows(request, ReservaBulkRequest)
+
+    parsed = []
+    for i, item in items:
+        try:
+            values = {
+                "id": item.id or uuid.uuid4(),
+                "paciente_id": UUID(item.paciente_id),
+                "profesional_id": UUID(item.profesional_id),
+                "tratamiento_id": UUID(item.tratamiento_id),
+                "fecha": item.fecha,
+                "hora_inicio": item.hora_inicio,
+                "hora_fin": item.hora_fin,
+                "atencion": item.atencion,
+                "pago": item.pago,
+                # Importing a soft-deleted id restores it
+                "deleted_at": None
+            }
+        except ValueError:
+            errors.append(row_error(i, "Invalid id"))
+            continue
+        if values["hora_fin"] <= values["hora_inicio"]:
+            errors.append(row_error(i, "hora_fin must be after hora_inicio"))
+            continue
+        parsed.append((i, values))
+
+    pacientes = await existing_values(db, Paciente.id, (v["paciente_id"] for _, v in parsed))
+    profesionales = await existing_values(db, Profesional.id, (v["profesional_id"] for _, v in parsed))
+    tratamientos = await existing_values(db, Tratamiento.id, (v["tratamiento_id"] for _, v in parsed))
+
+    rows = []
+    for i, values in parsed:
+        if values["paciente_id"] not in pacientes:
+            errors.append(row_error(i, "Paciente not found"))
+        elif values["profesional_id"] not in profesionales:
+            errors.append(row_error(i, "Profesional not found"))
+        elif values["tratamiento_id"] not in tratamientos:
+            errors.append(row_error(i, "Tratamiento not found"))
+        else:
+            rows.append((i, values))
+    # Keeps a professional's day in one chunk, where overlaps are checked
+    rows.sort(key=lambda row: (row[1]["profesional_id"], row[1]["fecha"], row[1]["hora_inicio"]))
+
+    # Days and professionals the batch touches: the new values and the old
+    # values of overwritten or restored rows
+    claves = {(v["fecha"], v["profesional_id"]) for _, v in rows}
+    for chunk in chunked({v["id"] for _, v in rows}, IN_CHUNK_SIZE):
+        for modelo in (Reserva, ReservaArchivada):
+            claves.update(tuple(r) for r in await db.execute(select(modelo.fecha, modelo.profesional_id).filter(modelo.id.in_(chunk))))
+
+    written, write_errors = await upsert(db, Reserva, rows, [
+        "paciente_id", "profesional_id", "tratamiento_id", "fecha", "hora_inicio", "hora_fin", "atencion", "pago", "deleted_at"
+    ], check=check_importacion)
+    await refresh_dias(db, {fecha for fecha, _ in claves})
+    fallidas = {e["row"] for e in write_errors}
+    await programar_recordatorios(db, [(v["id"], v["fecha"]) for i, v in rows if i not in fallidas])
+    await db.commit()
+    if written:
+        # One event for the whole batch; subscribers refetch their view
+        await broker.publish(canales(claves), {"tipo": "importacion"})
+    return report(total, written, errors + write_errors)
+
+@router.post("/", status_code=status.HTTP_201_CREATED, response_model=ReservaResponse)
+async def create_reserva(user: user_dependency, db: write_db_dependency, response: Response, reserva_request: ReservaRequest):
     if user is None:
         raise HTTPException(status_code=401, detail="Authentication Failed")
     reserva_model = Reserva()
@@ -108,17 +560,29 @@ async def create_reserva(user: user_dependency, db: db_dependency, reserva_reque
     reserva_model.atencion = reserva_request.atencion
     reserva_model.pago = reserva_request.pago
 
+    await check_referencias(db, reserva_model.paciente_id, reserva_model.tratamiento_id)
+    await check_disponible(db, reserva_model.profesional_id, reserva_model.fecha, reserva_model.hora_inicio, reserva_model.hora_fin)
 
     db.add(reserva_model)
-    db.commit()
+    await db.flush()
+    await refresh_dias(db, {reserva_model.fecha})
+    await programar_recordatorios(db, [(reserva_model.id, reserva_model.fecha)])
+    await db.commit()
+    await publicar("creada", reserva_model, {(reserva_model.fecha, reserva_model.profesional_id)})
+    response.headers["ETag"] = etag(reserva_model)
+    return reserva_model
 
 @router.put("/{reserva_id}", status_code=status.HTTP_204_NO_CONTENT)
-async def update_reserva(user: user_dependency, db: db_dependency, reserva_request: ReservaRequest, reserva_id: str):
+async def update_reserva(user: user_dependency, db: write_db_dependency, response: Response, reserva_request: ReservaRequest, reserva_id: str,
+                         if_match: Annotated[Optional[str], Header()] = None):
     if user is None:
         raise HTTPException(status_code=401, detail="Authentication Failed")
-    reserva_model = db.query(Reserva).filter(Reserva.id == UUID(reserva_id)).first()
-    if reserva_model is None:
+    reserva_model = await db.get(Reserva, UUID(reserva_id))
+    if reserva_model is None or reserva_model.deleted_at is not None:
         raise HTTPException(status_code=404, detail="Reserva not found")
+    check_if_match(if_match, reserva_model)
+    fecha_anterior = reserva_model.fecha
+    profesional_anterior = reserva_model.profesional_id
     reserva_model.paciente_id = UUID(reserva_request.paciente_id)
     reserva_model.profesional_id = UUID(reserva_request.profesional_id)
     reserva_model.tratamiento_id = UUID(reserva_request.tratamiento_id)
@@ -128,16 +592,28 @@ async def update_reserva(user: user_dependency, db: db_dependency, reserva_reque
     reserva_model.atencion = reserva_request.atencion
     reserva_model.pago = reserva_request.pago
 
+    await check_referencias(db, reserva_model.paciente_id, reserva_model.tratamiento_id)
+    await check_disponible(db, reserva_model.profesional_id, reserva_model.fecha, reserva_model.hora_inicio, reserva_model.hora_fin, reserva_model.id)
+
     db.add(reserva_model)
-    db.commit()
+    await flush(db)
+    await refresh_dias(db, {fecha_anterior, reserva_model.fecha})
+    await programar_recordatorios(db, [(reserva_model.id, reserva_model.fecha)])
+    await db.commit()
+    await publicar("actualizada", reserva_model, {(fecha_anterior, profesional_anterior), (reserva_model.fecha, reserva_model.profesional_id)})
+    response.headers["ETag"] = etag(reserva_model)
 
 @router.delete("/{reserva_id}", status_code=status.HTTP_204_NO_CONTENT)
-async def delete_reserva(user: user_dependency, db: db_dependency, reserva_id: str):
+async def delete_reserva(user: user_dependency, db: write_db_dependency, reserva_id: str):
     if user is None:
         raise HTTPException(status_code=401, detail="Authentication Failed")
-    reserva_model = db.query(Reserva).filter(Reserva.id == UUID(reserva_id)).first()
-    if reserva_model is None:
+    reserva_model = await db.get(Reserva, UUID(reserva_id))
+    if reserva_model is None or reserva_model.deleted_at is not None:
         raise HTTPException(status_code=404, detail="Reserva not Found")
-    
-    db.query(Reserva).filter(Reserva.id == reserva_id).delete()
-    db.commit()
\ No newline at end of file
+
+    # Soft delete; archivo moves the row out of the hot table on its next run
+    reserva_model.deleted_at = datetime.now(timezone.utc).replace(tzinfo=None)
+    await flush(db)
+    await refresh_dias(db, {reserva_model.fecha})
+    await db.commit()
+    await publicar("eliminada", reserva_model, {(reserva_model.fecha, reserva_model.profesional_id)})
\ No newline at end of file
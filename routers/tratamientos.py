@@ -1,78 +1,112 @@
+from datetime import datetime
 from typing import Annotated, Optional
-from fastapi import APIRouter, Depends, HTTPException
-from pydantic import BaseModel
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, Header, HTTPException, Request, Response
+from pydantic import BaseModel, ConfigDict
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from starlette import status
 from uuid import UUID
 
-from database import SessionLocal
+from archivo import borrar_archivadas
+from cache import ResponseCache
+from concurrency import check_if_match, etag, flush
+from database import get_db, get_write_db
 from routers.auth import get_current_user
-from models import Tratamiento
+from models import Tratamiento, Reserva, ReservaArchivada
+from reporting import refresh_dias, refresh_tratamiento
 
 
 router = APIRouter(prefix="/tratamientos", tags=["Tratamientos"])
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
 class TratamientoRequest(BaseModel):
     nombre: str
     descripcion: Optional[str]
     duracion_minutos: int
     precio: int
 
-db_dependency = Annotated[Session, Depends(get_db)]
+class TratamientoResponse(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: UUID
+    nombre: str
+    descripcion: Optional[str]
+    duracion_minutos: int
+    precio: float
+    created_at: Optional[datetime]
+    version: int
+
+db_dependency = Annotated[AsyncSession, Depends(get_db)]
+write_db_dependency = Annotated[AsyncSession, Depends(get_write_db)]
 user_dependency = Annotated[dict, Depends(get_current_user)]
 
-@router.get("/", status_code=status.HTTP_200_OK)
-async def get_all(user: user_dependency, db: db_dependency):
+tratamientos_cache = ResponseCache("tratamientos", list[TratamientoResponse])
+
+@router.get("/", status_code=status.HTTP_200_OK, response_model=list[TratamientoResponse])
+async def get_all(request: Request, user: user_dependency, db: db_dependency):
     if user is None:
         raise HTTPException(status_code=401, detail="Authentication Failed")
-    return db.query(Tratamiento).all()
 
-@router.get("/{tratamiento_id}", status_code=status.HTTP_200_OK)
-async def get_tratamiento(user: user_dependency, db: db_dependency, tratamiento_id: str):
+    async def load():
+        return (await db.scalars(select(Tratamiento))).all()
+
+    return await tratamientos_cache.respond(request, load)
+
+@router.get("/{tratamiento_id}", status_code=status.HTTP_200_OK, response_model=TratamientoResponse)
+async def get_tratamiento(user: user_dependency, db: db_dependency, response: Response, tratamiento_id: str):
     if user is None:
         raise HTTPException(status_code=401, detail="Authentication Failed")
-    tratamiento_model = db.query(Tratamiento).filter(Tratamiento.id == UUID(tratamiento_id)).first()
-    if tratamiento_model is not None:
+    tratamiento_model = await db.get(Tratamiento, UUID(tratamiento_id))
+    if tratamiento_model is None:
         raise HTTPException(status_code=404, detail="Tratamiento not found")
+    response.headers["ETag"] = etag(tratamiento_model)
     return tratamiento_model
 
-@router.post("/", status_code=status.HTTP_201_CREATED)
-async def create_tratamiento(user: user_dependency, db: db_dependency, tratamiento_request: TratamientoRequest):
+@router.post("/", status_code=status.HTTP_201_CREATED, response_model=TratamientoResponse)
+async def create_tratamiento(user: user_dependency, db: write_db_dependency, response: Response, tratamiento_request: TratamientoRequest):
     if user is None:
         raise HTTPException(status_code=401, detail="Authentication Failed")
     tratamiento_model = Tratamiento(**tratamiento_request.model_dump())
     db.add(tratamiento_model)
-    db.commit()
+    await db.commit()
+    await tratamientos_cache.invalidate()
+    response.headers["ETag"] = etag(tratamiento_model)
+    return tratamiento_model
 
 @router.put("/{tratamiento_id}", status_code=status.HTTP_204_NO_CONTENT)
-async def update_tratamiento(user: user_dependency, db: db_dependency, tratamiento_request: TratamientoRequest, tratamiento_id: str):
+async def update_tratamiento(user: user_dependency, db: write_db_dependency, response: Response, tratamiento_request: TratamientoRequest, tratamiento_id: str,
+                             if_match: Annotated[Optional[str], Header()] = None):
     if user is None:
         raise HTTPException(status_code=401, detail="Authentication Failed")
-    tratamiento_model = db.query(Tratamiento).filter(Tratamiento.id == UUID(tratamiento_id)).first()
+    tratamiento_model = await db.get(Tratamiento, UUID(tratamiento_id))
     if tratamiento_model is None:
         raise HTTPException(status_code=404, detail="Tratamiento not found")
+    check_if_match(if_match, tratamiento_model)
     tratamiento_model.nombre = tratamiento_request.nombre
     tratamiento_model.descripcion = tratamiento_request.descripcion
     tratamiento_model.duracion_minutos = tratamiento_request.duracion_minutos
     tratamiento_model.precio = tratamiento_request.precio
 
     db.add(tratamiento_model)
-    db.commit()
+    await flush(db)
+    await refresh_tratamiento(db, tratamiento_model.id)
+    await db.commit()
+    await tratamientos_cache.invalidate()
+    response.headers["ETag"] = etag(tratamiento_model)
 
 @router.delete("/{tratamiento_id}", status_code=status.HTTP_204_NO_CONTENT)
-async def delete_tratamiento(user: user_dependency, db: db_dependency, tratamiento_id: str):
+async def delete_tratamiento(user: user_dependency, db: write_db_dependency, tratamiento_id: str):
     if user is None:
         raise HTTPException(status_code=401, detail="Authentication Failed")
-    tratamiento_model = db.query(Tratamiento).filter(Tratamiento.id == UUID(tratamiento_id)).first()
+    tratamiento_model = await db.get(Tratamiento, UUID(tratamiento_id))
     if tratamiento_model is None:
         raise HTTPException(status_code=404, detail="Tratamiento not Found")
-    
-    db.query(Tratamiento).filter(Tratamiento.id == UUID(tratamiento_id)).delete()
-    db.commit()
\ No newline at end of file
+
+    # The database cascades the delete to its reservas and archived ones are
+    # removed here; their days' reports are refreshed in the same transaction
+    fechas = set((await db.scalars(select(Reserva.fecha).filter(Reserva.tratamiento_id == tratamiento_model.id).distinct())).all())
+    fechas.update(await borrar_archivadas(db, ReservaArchivada.tratamiento_id == tratamiento_model.id))
+    await db.delete(tratamiento_model)
+    await flush(db)
+    await refresh_dias(db, fechas)
+    await db.commit()
+    await tratamientos_cache.invalidate()
\ No newline at end of file
@@ -1,51 +1,62 @@
 from fastapi import APIRouter, Depends, HTTPException
-from typing import Annotated
-from sqlalchemy.orm import Session
-from passlib.context import CryptContext
-from pydantic import BaseModel
+from datetime import datetime
+from typing import Annotated, Optional
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import AsyncSession
+from pydantic import BaseModel, ConfigDict
 from starlette import status
 from uuid import UUID
 
-from database import SessionLocal
+from database import get_db, get_write_db
 from models import User
-from routers.auth import get_current_user
+from passwords import hash_password, verify_password
+from routers.auth import get_current_user, user_cache
 
 router = APIRouter(prefix="/user", tags=["Users"])
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
-db_dependency = Annotated[Session, Depends(get_db)]
+db_dependency = Annotated[AsyncSession, Depends(get_db)]
+write_db_dependency = Annotated[AsyncSession, Depends(get_write_db)]
 user_dependency = Annotated[dict, Depends(get_current_user)]
-bcrypt_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 class UserVerification(BaseModel):
     password: str
     new_password: str
 
-@router.get("/", status_code=status.HTTP_200_OK)
+class UserResponse(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: UUID
+    email: str
+    role: str
+    created_at: Optional[datetime]
+
+@router.get("/", status_code=status.HTTP_200_OK, response_model=UserResponse)
 async def get_users(user: user_dependency, db: db_dependency):
     if user is None:
         raise HTTPException(status_code=401, detail="Authentication Failed")
-    user_model = db.query(User).filter(User.id == UUID(user.id)).first()
+    cached_user = user_cache.get(user["id"])
+    if cached_user is not None:
+        return cached_user
+    user_model = await db.get(User, UUID(user["id"]))
     if user_model is None:
         raise HTTPException(status_code=404, detail="User Not Found")
-    return user_model
+    cached_user = {c.name: getattr(user_model, c.name) for c in User.__table__.columns}
+    user_cache.set(user["id"], cached_user)
+    return cached_user
 
 @router.put("/password", status_code=status.HTTP_204_NO_CONTENT)
-async def change_password(user: user_dependency, db: db_dependency, user_verification: UserVerification):
+async def change_password(user: user_dependency, db: db_dependency, write_db: write_db_dependency, user_verification: UserVerification):
     if user is None:
         raise HTTPException(status_code=401, detail="Authentication Failed")
-    user_model = db.query(User).filter(User.id == UUID(user.id)).first()
+    user_model = await db.get(User, UUID(user["id"]))
     if user_model is None:
         raise HTTPException(status_code=404, detail="User not found")
-    if not bcrypt_context.verify(user_verification.password, user_model.hashed_password):
+    valid, _ = await verify_password(user_verification.password, user_model.hashed_password)
+    if not valid:
         raise HTTPException(status_code=404, detail="Error on password change")
-    user_model.hashed_password = bcrypt_context.hash(user_verification.new_password)
+    new_hash = await hash_password(user_verification.new_password)
 
-    db.add(user_model)
-    db.commit()
\ No newline at end of file
+    # Read and bcrypt run on the read session; only the update takes the write connection
+    await write_db.execute(update(User).filter(User.id == user_model.id).values(hashed_password=new_hash))
+    await write_db.commit()
+    user_cache.delete(user["id"])
\ No newline at end of file
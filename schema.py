@@ -0,0 +1,89 @@
+import fcntl
+import os
+from contextlib import contextmanager
+
+from sqlalchemy import create_engine, inspect
+from sqlalchemy.exc import DBAPIError
+
+from database import SQLALCHEMY_DATABASE_URL
+
+# Alembic is imported only when a migration is due: importing it costs more
+# than the rest of the startup check together
+
+ALEMBIC_INI = os.path.join(os.path.dirname(os.path.abspath(__file__)), "alembic.ini")
+# Latest migration; bump it with every new revision. A stale value is never
+# wrong, it only sends each startup through the full Alembic upgrade
+SCHEMA_REVISION = "0009"
+# Revision matching the tables that metadata.create_all used to build, for
+# databases that predate the migrations
+BASELINE_REVISION = "0001"
+# Set to false where `alembic upgrade head` runs as a deploy step
+AUTO_MIGRATE = os.getenv("DB_AUTO_MIGRATE", "true").lower() == "true"
+PG_LOCK_ID = 7_304_112
+
+def alembic_config(url: str = SQLALCHEMY_DATABASE_URL):
+    from alembic.config import Config
+
+    # Keeps env.py from replacing the app's logging setup with alembic.ini's
+    return Config(ALEMBIC_INI, attributes={"url": url, "configure_logger": False})
+
+def stored_revision(connection):
+    try:
+        return connection.exec_driver_sql("SELECT version_num FROM alembic_version").scalar()
+    except DBAPIError:
+        return None
+
+@contextmanager
+def migration_lock(engine):
+    """Lets one process migrate at a time when several workers start together."""
+    if engine.dialect.name == "postgresql":
+        with engine.connect() as connection:
+            connection.exec_driver_sql(f"SELECT pg_advisory_lock({PG_LOCK_ID})")
+            try:
+                yield
+            finally:
+                connection.exec_driver_sql(f"SELECT pg_advisory_unlock({PG_LOCK_ID})")
+    elif engine.dialect.name == "sqlite" and engine.url.database not in (None, "", ":memory:"):
+        with open(f"{engine.url.database}.migrate.lock", "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+    else:
+        yield
+
+def upgrade(url: str = SQLALCHEMY_DATABASE_URL):
+    """Migrates the database to the latest revision, stamping one created
+    before the migrations existed as the baseline first."""
+    from alembic import command
+
+    config = alembic_config(url)
+    engine = create_engine(url)
+    try:
+        with migration_lock(engine):
+            # Checked under the lock: another worker may have migrated already
+            with engine.connect() as connection:
+                unversioned = stored_revision(connection) is None and inspect(connection).has_table("users")
+            if unversioned:
+                command.stamp(config, BASELINE_REVISION)
+            command.upgrade(config, "head")
+    finally:
+        engine.dispose()
+
+def ensure_schema(engine):
+    """Startup check; a single query when the schema is current."""
+    with engine.connect() as connection:
+        current = stored_revision(connection)
+    if current == SCHEMA_REVISION:
+        return
+    url = engine.url.render_as_string(hide_password=False)
+    if AUTO_MIGRATE:
+        upgrade(url)
+        return
+
+    from alembic.script import ScriptDirectory
+
+    head = ScriptDirectory.from_config(alembic_config(url)).get_current_head()
+    if current != head:
+        raise RuntimeError(f"Database schema is at revision {current}, expected {head}; run `alembic upgrade head`")
@@ -0,0 +1,141 @@
+from sqlalchemy import select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models import Paciente
+
+# Same expression in the PostgreSQL index and query so the planner can use it
+PG_SEARCH_EXPRESSION = "lower(nombre || ' ' || apellido || ' ' || telefono || ' ' || coalesce(email, ''))"
+
+SQLITE_SETUP = [
+    # External-content FTS5 table over pacientes; trigram tokens give
+    # substring matches on names, phone numbers and emails
+    """CREATE VIRTUAL TABLE IF NOT EXISTS pacientes_fts USING fts5(
+        nombre, apellido, telefono, email,
+        content='pacientes', content_rowid='rowid', tokenize='trigram'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS pacientes_fts_insert AFTER INSERT ON pacientes BEGIN
+        INSERT INTO pacientes_fts(rowid, nombre, apellido, telefono, email)
+        VALUES (new.rowid, new.nombre, new.apellido, new.telefono, new.email);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS pacientes_fts_delete AFTER DELETE ON pacientes BEGIN
+        INSERT INTO pacientes_fts(pacientes_fts, rowid, nombre, apellido, telefono, email)
+        VALUES ('delete', old.rowid, old.nombre, old.apellido, old.telefono, old.email);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS pacientes_fts_update AFTER UPDATE ON pacientes BEGIN
+        INSERT INTO pacientes_fts(pacientes_fts, rowid, nombre, apellido, telefono, email)
+        VALUES ('delete', old.rowid, old.nombre, old.apellido, old.telefono, old.email);
+        INSERT INTO pacientes_fts(rowid, nombre, apellido, telefono, email)
+        VALUES (new.rowid, new.nombre, new.apellido, new.telefono, new.email);
+    END""",
+]
+
+POSTGRESQL_SETUP = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    f"CREATE INDEX IF NOT EXISTS ix_pacientes_busqueda_trgm ON pacientes USING gin (({PG_SEARCH_EXPRESSION}) gin_trgm_ops)",
+]
+
+SQLITE_SEARCH_COLUMNS = ("p.nombre", "p.apellido", "p.telefono", "coalesce(p.email, '')")
+
+# Unranked: bm25 over every match of a common name is what makes ranked
+# FTS slow. search_pacientes asks for word-start matches first instead, so
+# the LIMIT never cuts one of those in favour of a mid-word match
+SQLITE_QUERY = """
+    SELECT p.* FROM pacientes_fts
+    JOIN pacientes p ON p.rowid = pacientes_fts.rowid
+    WHERE pacientes_fts MATCH :match{where}
+    LIMIT :limit
+"""
+
+POSTGRESQL_QUERY = f"""
+    SELECT * FROM pacientes
+    WHERE :q <% {PG_SEARCH_EXPRESSION}
+    ORDER BY word_similarity(:q, {PG_SEARCH_EXPRESSION}) DESC
+    LIMIT :limit
+"""
+
+MIN_TERM_LENGTH = 3
+MAX_CANDIDATES = 100
+
+def ensure_search_index(connection):
+    """Creates the search index and its sync triggers if they are missing."""
+    if connection.dialect.name == "postgresql":
+        for statement in POSTGRESQL_SETUP:
+            connection.execute(text(statement))
+    elif connection.dialect.name == "sqlite":
+        created = connection.execute(text("SELECT 1 FROM sqlite_master WHERE name = 'pacientes_fts'")).first() is None
+        for statement in SQLITE_SETUP:
+            connection.execute(text(statement))
+        if created:
+            connection.execute(text("INSERT INTO pacientes_fts(pacientes_fts) VALUES ('rebuild')"))
+
+def _quote(term: str) -> str:
+    return '"' + term.replace('"', '""') + '"'
+
+def _trigrams(term: str):
+    return {term[i:i + 3] for i in range(len(term) - 2)}
+
+def _fuzzy_pieces(term: str):
+    # A single typo leaves at least one half of a long term intact; short
+    # terms fall back to their trigrams
+    if len(term) >= 2 * MIN_TERM_LENGTH:
+        middle = len(term) // 2
+        return [term[:middle], term[middle:]]
+    return sorted(_trigrams(term))
+
+def _score(terms, paciente) -> float:
+    words = f"{paciente.nombre} {paciente.apellido} {paciente.telefono} {paciente.email or ''}".lower().split()
+    score = 0.0
+    for term in terms:
+        term_trigrams = _trigrams(term)
+        best = 0.0
+        for word in words:
+            if word.startswith(term):
+                best = max(best, 2.0)
+            elif term in word:
+                best = max(best, 1.5)
+            else:
+                word_trigrams = _trigrams(word)
+                best = max(best, len(term_trigrams & word_trigrams) / len(term_trigrams | word_trigrams))
+        score += best
+    return score
+
+def _escape_like(term: str) -> str:
+    return term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+def _word_start(i: int) -> str:
+    # LIKE ignores ASCII case in SQLite; one comparison per column is
+    # cheaper than one over the columns concatenated
+    return "(" + " OR ".join(
+        f"{column} LIKE :inicio{i} ESCAPE '\\' OR {column} LIKE :palabra{i} ESCAPE '\\'" for column in SQLITE_SEARCH_COLUMNS
+    ) + ")"
+
+async def _fts(db: AsyncSession, match: str, where: str = "", params=None, limit: int = MAX_CANDIDATES):
+    statement = select(Paciente).from_statement(text(SQLITE_QUERY.format(where=where)))
+    return (await db.scalars(statement, {"match": match, "limit": limit, **(params or {})})).all()
+
+async def search_pacientes(db: AsyncSession, q: str, limit: int):
+    terms = [t for t in q.lower().split() if len(t) >= MIN_TERM_LENGTH]
+    if not terms:
+        return []
+    if db.bind.dialect.name == "postgresql":
+        statement = select(Paciente).from_statement(text(POSTGRESQL_QUERY))
+        return (await db.scalars(statement, {"q": " ".join(terms), "limit": limit})).all()
+
+    # Every term as a substring; those starting a word take the candidate
+    # slots first, mid-word matches fill the rest
+    match = " AND ".join(_quote(t) for t in terms)
+    prefijos = " AND ".join(_word_start(i) for i in range(len(terms)))
+    params = {}
+    for i, term in enumerate(terms):
+        params[f"inicio{i}"] = _escape_like(term) + "%"
+        params[f"palabra{i}"] = "% " + _escape_like(term) + "%"
+    candidatos = {p.id: p for p in await _fts(db, match, f" AND {prefijos}", params)}
+    if len(candidatos) < MAX_CANDIDATES:
+        for paciente in await _fts(db, match, f" AND NOT ({prefijos})", params, MAX_CANDIDATES - len(candidatos)):
+            candidatos[paciente.id] = paciente
+    if len(candidatos) < limit:
+        # Typo tolerance: each term must still match approximately
+        fuzzy = " AND ".join("(" + " OR ".join(_quote(p) for p in _fuzzy_pieces(t)) + ")" for t in terms)
+        for paciente in await _fts(db, fuzzy):
+            candidatos.setdefault(paciente.id, paciente)
+    return sorted(candidatos.values(), key=lambda p: _score(terms, p), reverse=True)[:limit]
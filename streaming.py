@@ -0,0 +1,37 @@
+import csv
+import io
+import json
+
+from fastapi.responses import StreamingResponse
+
+from database import AsyncSessionLocal
+
+CHUNK_ROWS = 1000
+
+MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+def _serialize(rows, columns, formato):
+    buffer = io.StringIO()
+    if formato == "csv":
+        csv.writer(buffer).writerows(rows)
+    else:
+        for row in rows:
+            buffer.write(json.dumps(dict(zip(columns, row)), default=str))
+            buffer.write("\n")
+    return buffer.getvalue()
+
+def stream_query(statement, formato, filename):
+    # The request-scoped session is closed before the body is sent, so the
+    # generator owns its own session and keeps a server-side cursor open
+    # while rows are written out in chunks.
+    async def generate():
+        async with AsyncSessionLocal() as db:
+            result = await db.stream(statement.execution_options(yield_per=CHUNK_ROWS))
+            columns = list(result.keys())
+            if formato == "csv":
+                yield _serialize([columns], columns, formato)
+            async for rows in result.partitions():
+                yield _serialize(rows, columns, formato)
+
+    headers = {"Content-Disposition": f'attachment; filename="{filename}.{formato}"'}
+    return StreamingResponse(generate(), media_type=MEDIA_TYPES[formato], headers=headers)